@@ -0,0 +1,31 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Benchmarks of the Metasequoia add-on which run without Blender.
+
+    python -m benchmarks.generate OUT_FILE [options]  write a synthetic file
+    python -m benchmarks.run [--out FILE] [--compare FILE]
+
+run times the parser, the serializer, the importer and the exporter on a
+generated corpus and records the throughput and the peak memory in a JSON
+file. When bpy can't be imported, a small stand-in (benchmarks.standin)
+replaces bpy, bpy_extras and mathutils.
+"""
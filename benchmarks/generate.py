@@ -0,0 +1,209 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Synthetic Metasequoia documents.
+
+The corpus is random but reproducible (seeded). Files can use text or
+BVertex vertices, carry weit chunks, Shift-JIS object names, materials
+(optionally textured) and UVs, and be stored in a .mqoz archive, so every
+path of the parser can be exercised at any size.
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import zipfile
+import zlib
+from array import array
+
+# faces per line join, keeps the generator itself fast
+CHUNK = 4096
+
+
+def generate(path, objects=1, verts=1000, faces=None, mix=(1, 1, 0),
+             ngon_sides=(5, 8), bvertex=False, weit=False, shift_jis=False,
+             uv=True, materials=1, textures=False, seed=0):
+    """Write a synthetic document to path and return its statistics.
+
+    mix is the relative weight of triangles, quads and ngons (with
+    ngon_sides corners). A path ending with .mqoz is written as an archive.
+    With textures every material gets a tex() image, written next to path.
+    The returned dict holds objects, verts, faces, loops and bytes.
+    """
+    rng = random.Random(seed)
+    faces = verts if faces is None else faces
+    sizes = _face_sizes(rng, faces, mix, ngon_sides)
+    parts = [b"Metasequoia Document\r\nFormat Text Ver 1.1\r\n\r\n"
+             b"Scene {\r\n\tpos 0.0000 0.0000 1500.0000\r\n"
+             b"\tlookat 0.0000 0.0000 0.0000\r\n\thead -0.5236\r\n"
+             b"\tpich 0.5236\r\n\tortho 0\r\n\tzoom2 5.0000\r\n"
+             b"\tamb 0.250 0.250 0.250\r\n}\r\n"]
+    if materials:
+        parts.append(b"Material %d {\r\n" % materials)
+        for i in range(materials):
+            parts.append(b'\t"mat%d" shader(3) col(%.3f %.3f %.3f 1.000) '
+                         b'dif(0.800) amb(0.600) emi(0.000) spc(0.000) '
+                         b'power(5.00)' % (i, rng.random(), rng.random(),
+                                           rng.random()))
+            if textures:
+                tex_name = "tex%d.png" % i
+                parts.append(b' tex("%s")' % tex_name.encode())
+                with open(os.path.join(os.path.dirname(path), tex_name), "wb") as fp:
+                    fp.write(_png(rng))
+            parts.append(b"\r\n")
+        parts.append(b"}\r\n")
+    for i in range(objects):
+        if shift_jis:
+            name = ("オブジェクト%d" % i).encode("shift_jis")
+        else:
+            name = b"obj%d" % i
+        parts.extend(_object(rng, name, verts, sizes, bvertex, weit, uv,
+                             materials))
+    parts.append(b"Eof\r\n")
+
+    data = b"".join(parts)
+    if path.lower().endswith(".mqoz"):
+        member = os.path.splitext(os.path.basename(path))[0] + ".mqo"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zfile:
+            zfile.writestr(member, data)
+    else:
+        with open(path, "wb") as fp:
+            fp.write(data)
+    return {"objects": objects,
+            "verts": objects * verts,
+            "faces": objects * len(sizes),
+            "loops": objects * sum(sizes),
+            "bytes": len(data),
+            "file_bytes": os.path.getsize(path)}
+
+
+def _png(rng):
+    """Return a 1x1 RGB PNG image of a random color."""
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data)))
+    pixel = b"\0" + bytes(rng.randrange(256) for i in range(3))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(pixel)) + chunk(b"IEND", b""))
+
+
+def _face_sizes(rng, faces, mix, ngon_sides):
+    low, high = ngon_sides
+    choices = rng.choices((3, 4, 0), weights=mix, k=faces)
+    return [size or rng.randint(low, high) for size in choices]
+
+
+def _object(rng, name, verts, sizes, bvertex, weit, uv, materials):
+    parts = [b'Object "%s" {\r\n\tdepth 0\r\n\tfolding 0\r\n'
+             b'\tscale 1.000000 1.000000 1.000000\r\n'
+             b'\trotation 0.000000 0.000000 0.000000\r\n'
+             b'\ttranslation 0.000000 0.000000 0.000000\r\n'
+             b'\tvisible 15\r\n\tlocking 0\r\n\tshading 1\r\n'
+             b'\tfacet 59.5\r\n\tcolor 0.898 0.498 0.698\r\n'
+             b'\tcolor_type 0\r\n' % name]
+    coords = array('f', [rng.uniform(-100.0, 100.0) for i in range(3 * verts)])
+    weit_lines = b""
+    if weit:
+        weit_lines = b"".join(b"\t\t\t%d %.3f\r\n" % (i, rng.random())
+                              for i in range(verts))
+    if bvertex:
+        payload = coords[:]
+        if sys.byteorder != "little":
+            payload.byteswap()
+        raw = payload.tobytes()
+        parts.append(b"\tBVertex %d {\r\n\t\tVector %d [%d]\r\n"
+                     % (verts, verts, len(raw)))
+        parts.append(raw)
+        parts.append(b"\r\n")
+        if weit:
+            parts.append(b"\t\tweit {\r\n" + weit_lines + b"\t\t}\r\n")
+        parts.append(b"\t}\r\n")
+    else:
+        parts.append(b"\tvertex %d {\r\n" % verts)
+        for start in range(0, 3 * verts, 3 * CHUNK):
+            chunk = coords[start:start + 3 * CHUNK]
+            parts.append(b"".join(b"\t\t%.4f %.4f %.4f\r\n" % tuple(chunk[k:k + 3])
+                                  for k in range(0, len(chunk), 3)))
+        parts.append(b"\t}\r\n")
+        if weit:
+            parts.append(b"\tvertexattr {\r\n\t\tweit {\r\n" + weit_lines
+                         + b"\t\t}\r\n\t}\r\n")
+
+    parts.append(b"\tface %d {\r\n" % len(sizes))
+    lines = []
+    for size in sizes:
+        # consecutive indices are distinct and cheap to draw
+        first = rng.randrange(max(verts - size, 1))
+        line = b"\t\t%d V(%s)" % (size, b" ".join(b"%d" % v for v in range(first, first + size)))
+        if materials:
+            line += b" M(%d)" % rng.randrange(materials)
+        if uv:
+            line += b" UV(%s)" % b" ".join(b"%.5f" % rng.random() for i in range(2 * size))
+        lines.append(line)
+        if len(lines) == CHUNK:
+            lines.append(b"")
+            parts.append(b"\r\n".join(lines))
+            lines = []
+    lines.append(b"")
+    parts.append(b"\r\n".join(lines))
+    parts.append(b"\t}\r\n}\r\n")
+    return parts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate",
+                                     description="Write a synthetic MQO file")
+    parser.add_argument("path", help="output .mqo or .mqoz file")
+    parser.add_argument("--objects", type=int, default=1)
+    parser.add_argument("--verts", type=int, default=1000,
+                        help="vertices per object")
+    parser.add_argument("--faces", type=int, help="faces per object "
+                        "(default: as many as vertices)")
+    parser.add_argument("--mix", type=float, nargs=3, default=(1, 1, 0),
+                        metavar=("TRI", "QUAD", "NGON"),
+                        help="relative weight of each face size")
+    parser.add_argument("--bvertex", action="store_true",
+                        help="binary BVertex instead of text vertices")
+    parser.add_argument("--weit", action="store_true",
+                        help="add a weit chunk to every object")
+    parser.add_argument("--shift-jis", action="store_true",
+                        help="Shift-JIS object names")
+    parser.add_argument("--no-uv", action="store_true")
+    parser.add_argument("--materials", type=int, default=1)
+    parser.add_argument("--textures", action="store_true",
+                        help="give every material a texture image")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    stats = generate(args.path, args.objects, args.verts, args.faces,
+                     args.mix, bvertex=args.bvertex, weit=args.weit,
+                     shift_jis=args.shift_jis, uv=not args.no_uv,
+                     materials=args.materials, textures=args.textures,
+                     seed=args.seed)
+    print("%s: %d objects, %d verts, %d faces, %d loops, %d bytes"
+          % (args.path, stats["objects"], stats["verts"], stats["faces"],
+             stats["loops"], stats["file_bytes"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Time the add-on on a generated corpus.
+
+Every case is a synthetic file written by benchmarks.generate. For each
+one the parser, the serializer, the importer (into bpy or the stand-in)
+and the exporter are timed, the best of --repeat runs is kept, and the
+peak Python memory of every phase is measured in a separate run under
+tracemalloc, so the tracing doesn't slow down the timings.
+
+With --compare the results are checked against an earlier --out file and
+the exit status is 1 when a phase is slower, or peaks at more memory,
+than the baseline by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pathlib
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from . import standin
+from .generate import generate
+
+# name -> generate() options, verts are per object at full size
+CASES = {
+    "tris": dict(objects=4, verts=50000, mix=(1, 0, 0)),
+    "mixed": dict(objects=4, verts=50000, mix=(1, 1, 1)),
+    "bvertex": dict(objects=4, verts=50000, mix=(1, 1, 0), bvertex=True),
+    "weit": dict(objects=4, verts=50000, mix=(1, 1, 0), weit=True),
+    "sjis": dict(objects=200, verts=1000, mix=(1, 1, 0), shift_jis=True),
+    "mqoz": dict(objects=4, verts=50000, mix=(1, 1, 0), path="mqoz"),
+    "textured": dict(objects=4, verts=50000, mix=(1, 1, 0), materials=8, textures=True,
+                     path="mqoz"),
+}
+PHASES = ("parse", "write", "import", "export")
+# --quick divides the vertex count of every case by this
+QUICK_FACTOR = 25
+
+
+def run_case(name, options, directory, repeat):
+    options = dict(options)
+    ext = ".mqoz" if options.pop("path", None) == "mqoz" else ".mqo"
+    path = os.path.join(directory, name + ext)
+    vertex_data = options.get("weit", False)
+    stats = generate(path, **options)
+
+    from io_scene_mqo import mqo_parser, mqo_writer
+    materials, objects = quiet(lambda: mqo_parser.parse_file(path, vertex_data=vertex_data))
+    out = os.path.join(directory, name + ".out" + ext)
+    phases = {
+        "parse": lambda: mqo_parser.parse_file(path, vertex_data=vertex_data),
+        "write": lambda: mqo_writer.write_file(
+            out, 1.1, None, [(ob, 0) for ob in objects], False, True, True,
+            options.get("bvertex", False), 1, ext == ".mqoz"),
+        "import": lambda: import_file(path, vertex_data),
+        "export": lambda: export_file(out, ext == ".mqoz"),
+    }
+    result = dict(stats)
+    for phase in PHASES:
+        seconds = best_time(phases[phase], repeat)
+        peak = peak_memory(phases[phase])
+        result[phase] = {
+            "seconds": seconds,
+            "peak_bytes": peak,
+            "mb_per_s": stats["file_bytes"] / seconds / 1e6 if seconds else 0.0,
+            "verts_per_s": stats["verts"] / seconds if seconds else 0.0,
+        }
+    return result
+
+
+def import_file(path, vertex_data):
+    from io_scene_mqo import import_mqo
+    clear_scene()
+    import_mqo.open_mqo(standin.Operator(), pathlib.Path(path), True, 1.0, False, 1,
+                        None, vertex_data=vertex_data)
+
+
+def export_file(path, mqoz):
+    """Export the objects of the last import, a .mqoz with its textures."""
+    import bpy
+    from io_scene_mqo import export_mqo
+    objects = [ob for ob in bpy.data.objects if ob.type == 'MESH']
+    export_mqo.export_mqo(standin.Operator(), path, objects, True, False, False, True,
+                          True, True, True, True, 1.0, mqoz=mqoz, pack_textures=mqoz)
+
+
+def clear_scene():
+    import bpy
+    if isinstance(bpy.data, standin.types.SimpleNamespace):
+        standin.reset()
+        return
+    for ob in list(bpy.data.objects):
+        bpy.data.objects.remove(ob)
+    for me in list(bpy.data.meshes):
+        bpy.data.meshes.remove(me)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
+    for collection in list(bpy.data.collections):
+        bpy.data.collections.remove(collection)
+
+
+def quiet(func):
+    """Run func without the messages the add-on prints."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func()
+
+
+def best_time(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        quiet(func)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        quiet(func)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every phase slower, or with a higher memory peak,
+    than baseline by more than tolerance (0.2 is 20 %).
+    """
+    regressions = []
+    for name, case in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        for phase in PHASES:
+            if phase not in case or phase not in base:
+                continue
+            for key, fmt in (("seconds", "%.4f s"), ("peak_bytes", "%d bytes")):
+                new, old = case[phase].get(key), base[phase].get(key)
+                if old and new is not None and new > old * (1 + tolerance):
+                    regressions.append("%s %s: %s, baseline %s (+%.0f %%)" % (
+                        name, phase, fmt % new, fmt % old, 100 * (new / old - 1)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Benchmark the MQO add-on")
+    parser.add_argument("--quick", action="store_true",
+                        help="%dx smaller files" % QUICK_FACTOR)
+    parser.add_argument("--case", action="append", choices=sorted(CASES),
+                        help="run only this case, may be repeated")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per phase, the best is kept")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown or memory growth against --compare (default 0.2)")
+    args = parser.parse_args(argv)
+
+    fake = standin.install()
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "bpy": "stand-in" if fake else "blender",
+        "quick": args.quick,
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="mqo_bench_") as directory:
+        for name in args.case or CASES:
+            options = dict(CASES[name])
+            if args.quick:
+                options["verts"] //= QUICK_FACTOR
+            case = run_case(name, options, directory, args.repeat)
+            results["cases"][name] = case
+            print("%-8s %9d verts %10d bytes  " % (name, case["verts"], case["file_bytes"])
+                  + "  ".join("%s %.3f s" % (phase, case[phase]["seconds"]) for phase in PHASES))
+
+    if args.out:
+        with open(args.out, 'w') as fp:
+            json.dump(results, fp, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        if baseline.get("quick") != args.quick:
+            print("warning: baseline and current run don't use the same --quick")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("regression: " + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Minimal stand-in of the Blender modules used by the add-on.
+
+Only what the importer and the exporter touch is implemented. Element
+collections store every property as one flat array so foreach_get and
+foreach_set cost a copy, like in Blender, and the timings measure the
+add-on code rather than the stand-in.
+"""
+
+import os
+import re
+import sys
+import types
+from array import array
+
+
+class Collection:
+    """bpy_prop_collection of mesh elements, one array per property."""
+
+    def __init__(self, fields):
+        # name -> (typecode, values per element)
+        self.fields = fields
+        self.data = {}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def add(self, count):
+        self.length += count
+
+    def foreach_set(self, attr, seq):
+        typecode, width = self.fields[attr]
+        self.data[attr] = array(typecode, seq)
+
+    def foreach_get(self, attr, seq):
+        typecode, width = self.fields[attr]
+        values = self.data.get(attr)
+        if values is None:
+            values = array(typecode, bytes(array(typecode).itemsize * width * self.length))
+        if values.typecode != seq.typecode:
+            values = array(seq.typecode, values)
+        seq[:] = values
+
+
+class UVLayer:
+    def __init__(self, name, num_loops):
+        self.name = name
+        self.data = Collection({"uv": ('f', 2)})
+        self.data.length = num_loops
+
+
+class UVLayers(list):
+    def __init__(self, mesh):
+        super().__init__()
+        self.mesh = mesh
+        self.active = None
+
+    def new(self, name="UVMap"):
+        layer = UVLayer(name, len(self.mesh.loops))
+        self.append(layer)
+        if self.active is None:
+            self.active = layer
+        return layer
+
+
+class ColorAttributes(list):
+    def __init__(self, mesh):
+        super().__init__()
+        self.mesh = mesh
+
+    def new(self, name, type, domain):
+        layer = types.SimpleNamespace(name=name, data=Collection({"color": ('f', 4)}))
+        layer.data.length = len(self.mesh.vertices)
+        self.append(layer)
+        return layer
+
+
+class Mesh:
+    def __init__(self, name):
+        self.name = name
+        self.vertices = Collection({"co": ('f', 3)})
+        self.edges = Collection({"vertices": ('i', 2), "is_loose": ('b', 1)})
+        self.loops = Collection({"vertex_index": ('i', 1)})
+        self.polygons = Collection({"loop_start": ('i', 1), "loop_total": ('i', 1),
+                                    "material_index": ('i', 1)})
+        self.loop_triangles = Collection({"loops": ('i', 3), "polygon_index": ('i', 1)})
+        self.uv_layers = UVLayers(self)
+        self.color_attributes = ColorAttributes(self)
+        self.materials = []
+
+    def as_pointer(self):
+        return id(self)
+
+    def validate(self, clean_customdata=True):
+        return False
+
+    def update(self, calc_edges=False, calc_edges_loose=False):
+        if calc_edges_loose:
+            # the stand-in only stores the edges added explicitly, which
+            # are the loose ones of the imported and generated meshes
+            self.edges.data["is_loose"] = array('b', [1]) * len(self.edges)
+
+    def calc_loop_triangles(self):
+        """Fan triangulation, Blender's is better but the count is the same."""
+        starts = array('i', bytes(4 * len(self.polygons)))
+        totals = array('i', bytes(4 * len(self.polygons)))
+        self.polygons.foreach_get("loop_start", starts)
+        self.polygons.foreach_get("loop_total", totals)
+        loops = array('i')
+        owners = array('i')
+        for p, (start, total) in enumerate(zip(starts, totals)):
+            for k in range(1, total - 1):
+                loops.extend((start, start + k, start + k + 1))
+            owners.extend([p] * (total - 2))
+        self.loop_triangles.length = len(owners)
+        self.loop_triangles.data = {"loops": loops, "polygon_index": owners}
+
+
+class VertexGroup:
+    def __init__(self, name):
+        self.name = name
+        self.weights = {}
+
+    def add(self, index, weight, type):
+        for i in index:
+            self.weights[i] = weight
+
+
+class VertexGroups(list):
+    def new(self, name="Group"):
+        group = VertexGroup(name)
+        self.append(group)
+        return group
+
+
+class Modifiers(dict):
+    def new(self, name, type):
+        mod = types.SimpleNamespace(name=name, type=type)
+        self[name] = mod
+        return mod
+
+
+class Object:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.type = 'MESH'
+        self.modifiers = Modifiers()
+        self.vertex_groups = VertexGroups()
+        self.users_collection = []
+        self.selected = False
+
+    def select_set(self, state):
+        self.selected = state
+
+
+class ObjectLinks(list):
+    def __init__(self, owner):
+        super().__init__()
+        self.owner = owner
+
+    def link(self, ob):
+        self.append(ob)
+        ob.users_collection.append(self.owner)
+
+
+class SceneCollection:
+    def __init__(self, name):
+        self.name = name
+        self.objects = ObjectLinks(self)
+        self.children = ChildLinks()
+
+
+class ChildLinks(list):
+    def link(self, collection):
+        self.append(collection)
+
+
+class Socket:
+    def __init__(self, node, name):
+        self.node = node
+        self.name = name
+        self.links = []
+        self.default_value = None
+
+    @property
+    def is_linked(self):
+        return bool(self.links)
+
+
+class Node:
+    # bl_idname -> (input names, output names)
+    SOCKETS = {
+        "ShaderNodeOutputMaterial": (("Surface", "Volume", "Displacement"), ()),
+        "ShaderNodeBsdfPrincipled": (("Base Color", "Alpha"), ("BSDF",)),
+        "ShaderNodeTexImage": (("Vector",), ("Color", "Alpha")),
+    }
+
+    def __init__(self, bl_idname):
+        self.bl_idname = bl_idname
+        inputs, outputs = self.SOCKETS[bl_idname]
+        self.inputs = {name: Socket(self, name) for name in inputs}
+        self.outputs = {name: Socket(self, name) for name in outputs}
+        self.image = None
+
+
+class NodeLinks(list):
+    def new(self, from_socket, to_socket):
+        link = types.SimpleNamespace(from_node=from_socket.node, from_socket=from_socket,
+                                     to_node=to_socket.node, to_socket=to_socket)
+        from_socket.links.append(link)
+        to_socket.links = [link]
+        self.append(link)
+        return link
+
+
+class NodeTree:
+    """Default tree of a material: a Principled BSDF into the output."""
+
+    def __init__(self):
+        self.nodes = IDList(Node)
+        self.links = NodeLinks()
+        output = self.nodes.new("ShaderNodeOutputMaterial")
+        shader = self.nodes.new("ShaderNodeBsdfPrincipled")
+        self.links.new(shader.outputs["BSDF"], output.inputs["Surface"])
+
+
+class Material(dict):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.diffuse_color = (0.8, 0.8, 0.8, 1.0)
+        self.specular_intensity = 0.5
+        self.blend_method = 'OPAQUE'
+        self.node_tree = None
+        self._use_nodes = False
+
+    @property
+    def use_nodes(self):
+        return self._use_nodes
+
+    @use_nodes.setter
+    def use_nodes(self, value):
+        self._use_nodes = value
+        if value and self.node_tree is None:
+            self.node_tree = NodeTree()
+
+    def as_pointer(self):
+        return id(self)
+
+
+class Image:
+    def __init__(self, filepath):
+        self.name = os.path.basename(filepath)
+        self.filepath = filepath
+        self.packed_file = None
+
+
+class IDList(list):
+    def __init__(self, factory):
+        super().__init__()
+        self.factory = factory
+
+    def new(self, *args):
+        item = self.factory(*args)
+        self.append(item)
+        return item
+
+    def load(self, path, check_existing=False):
+        """Images only: the file must exist, its content is not read."""
+        if check_existing:
+            for image in self:
+                if image.filepath == path:
+                    return image
+        if not os.path.isfile(path):
+            raise RuntimeError("Error: Cannot read '%s'" % path)
+        return self.new(path)
+
+
+class LayerObjects:
+    """Objects of the scene, reached from the scene collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.active = None
+
+    def __iter__(self):
+        stack = [self.collection]
+        seen = set()
+        while stack:
+            collection = stack.pop()
+            for ob in collection.objects:
+                if id(ob) not in seen:
+                    seen.add(id(ob))
+                    yield ob
+            stack.extend(collection.children)
+
+
+class ViewLayer:
+    def __init__(self, collection):
+        self.active_layer_collection = types.SimpleNamespace(collection=collection)
+        self.objects = LayerObjects(collection)
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+class Operator:
+    """Collects what the add-on reports."""
+
+    def __init__(self):
+        self.reports = []
+
+    def report(self, level, msg):
+        self.reports.append((level, msg))
+
+
+def reset():
+    """Empty bpy.data and the scene of the stand-in."""
+    bpy = sys.modules["bpy"]
+    scene_collection = SceneCollection("Scene Collection")
+    bpy.data = types.SimpleNamespace(meshes=IDList(Mesh), objects=IDList(Object),
+                                     materials=IDList(Material), images=IDList(Image),
+                                     collections=IDList(SceneCollection))
+    bpy.context = types.SimpleNamespace(
+        scene=types.SimpleNamespace(collection=scene_collection),
+        view_layer=ViewLayer(scene_collection))
+
+
+def install():
+    """Register the stand-in modules unless the real bpy can be imported.
+    Return True when the stand-in is used.
+    """
+    try:
+        import bpy  # noqa: F401
+        return False
+    except ImportError:
+        pass
+    bpy = types.ModuleType("bpy")
+    bpy.path = types.SimpleNamespace(
+        clean_name=lambda name: re.sub(r"[^\w.-]", "_", name),
+        basename=lambda path: os.path.basename(path[2:] if path.startswith("//") else path),
+        abspath=lambda path: path)
+    bpy.props = types.ModuleType("bpy.props")
+    bpy.types = types.ModuleType("bpy.types")
+    bpy_extras = types.ModuleType("bpy_extras")
+    bpy_extras.io_utils = types.ModuleType("bpy_extras.io_utils")
+    sys.modules.update({"bpy": bpy, "bpy.props": bpy.props, "bpy.types": bpy.types,
+                        "bpy_extras": bpy_extras, "bpy_extras.io_utils": bpy_extras.io_utils,
+                        "mathutils": types.ModuleType("mathutils")})
+    reset()
+    return True
+
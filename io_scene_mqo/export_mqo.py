@@ -36,14 +36,30 @@ http://wiki.blender.org/index.php/Dev:2.5/Py/Scripts/Cookbook/Code_snippets/Mult
 
 import os
 import time
-import pprint
 import bpy
-import mathutils
-import math
-import bpy_extras.io_utils
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from itertools import accumulate, compress
 
+from . import mqo_writer
+from .mqo_math import gather, transform_coords
+from .mqo_parser import MQOObject
+from .mqo_stats import Stats, finish
 
-def export_mqo(op, filepath, objects, rot90, invert, no_ngons, edge, uv_exp, uv_cor, mat_exp, mod_exp, scale):
+# object name -> (fingerprint, Object chunk parts) of the last incremental
+# export, kept for the Blender session
+_block_cache = {}
+# below this many loops in the scene a process pool costs more than it saves
+PARALLEL_MIN_LOOPS = 200000
+
+
+def export_mqo(op, filepath, objects, rot90, invert, no_ngons, edge, uv_exp, uv_cor, mat_exp, mod_exp, scale, bvertex=False,
+               mqoz=False, compress_level=6, pack_textures=False, workers=1, split_mode='NONE', incremental=False,
+               stats_path=None):
+    """Export objects to filepath. Returns the Stats of the export, which
+    are also written to stats_path when it is set.
+    """
     
     # Exit edit mode before exporting, so current object states are exported properly.
     #if bpy.ops.object.mode_set.poll():
@@ -54,205 +70,434 @@ def export_mqo(op, filepath, objects, rot90, invert, no_ngons, edge, uv_exp, uv_
         print(msg)
         op.report({'ERROR'}, msg)
         return
-    with open(filepath, 'w') as fp:
-        fw = fp.write
-        msg = ".mqo export: Writing %s" % filepath
+    stats = Stats("export")
+    mqoz = mqoz or filepath.lower().endswith(".mqoz")
+    if split_mode != 'NONE':
+        export_split(op, filepath, objects, rot90, invert, no_ngons, edge, uv_exp, uv_cor, mat_exp, mod_exp, scale,
+                     bvertex, mqoz, compress_level, pack_textures, workers, split_mode, stats)
+        finish(op, stats, stats_path)
+        return stats
+
+    # one analysis pass per mesh, shared by the pre-scan and the snapshots
+    with stats.phase("analyze"):
+        analyses = mesh_analyses(objects, edge)
+    with stats.phase("materials"):
+        version, materials, mat_maps, textures = prepare_document(op, objects, no_ngons, edge, mat_exp, pack_textures,
+                                                                  analyses)
+    stats.count("materials", len(materials or ()))
+    if workers == 0:
+        # automatic: a process pool only pays off for large scenes
+        total_loops = sum(len(ob.data.loops) for ob in objects)
+        workers = None if len(objects) > 1 and total_loops >= PARALLEL_MIN_LOOPS else 1
+
+    msg = ".mqo export: Writing %s" % filepath
+    print(msg)
+    op.report({'INFO'}, msg)
+    # Blender data is only read by iter_snapshots, each object is written as
+    # soon as it is formatted, possibly by worker processes
+    records = iter_snapshots(op, objects, mat_maps, rot90, no_ngons, edge, scale, mod_exp, analyses, stats)
+    if incremental:
+        cache = _block_cache
+    else:
+        # don't keep the text of the last export alive for nothing
+        _block_cache.clear()
+        cache = None
+    with _write_phase(stats):
+        mqo_writer.write_file(filepath, version, materials, records, invert, uv_exp, uv_cor, bvertex, workers,
+                              mqoz, compress_level, textures, cache, document_encoding(objects, materials))
+    stats.count("bytes_written", os.path.getsize(filepath))
+    if cache is not None:
+        names = set(ob.name for ob in objects)
+        for name in [name for name in cache if name not in names]:
+            del cache[name]
+
+    msg = ".mqo export: Export finished. Created %s" % filepath
+    print(msg,"\n")
+    op.report({'INFO'}, msg)
+    finish(op, stats, stats_path)
+    return stats
+
+
+@contextmanager
+def _write_phase(stats):
+    """Time the writer as the "write" phase. The snapshots (and the material
+    tables of split files) are taken while it consumes its input, their time
+    is already in their own phases and is left out.
+    """
+    nested = ("snapshot", "materials")
+    before = sum(stats.phases.get(name, 0.0) for name in nested)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.add_time("write", elapsed - (sum(stats.phases.get(name, 0.0) for name in nested) - before))
+
+
+def prepare_document(op, objects, no_ngons, edge, mat_exp, pack_textures, analyses):
+    """Return the header version, the material table, the global material
+    index of every material slot of every object and the textures to bundle
+    for one output file.
+    """
+    # the header version depends on ngons, decide it before writing anything
+    total_ngons = 0
+    if not no_ngons:
+        for ob in objects:
+            total_ngons += analyses[ob.data.as_pointer()].ngons
+    version = 1.1 if total_ngons > 0 else 1.0
+
+    # the Material chunk comes first so material indices are known
+    # before any object is written
+    registry = MaterialRegistry(op)
+    mat_maps = []
+    for ob in objects:
+        if mat_exp and not skip_object(ob, edge):
+            mat_maps.append(registry.slot_map(ob.data.materials))
+        else:
+            mat_maps.append(None)
+    textures = collect_textures(op, registry.images) if pack_textures else []
+    return version, (registry.lines if mat_exp else None), mat_maps, textures
+
+
+def export_split(op, filepath, objects, rot90, invert, no_ngons, edge, uv_exp, uv_cor, mat_exp, mod_exp, scale,
+                 bvertex, mqoz, compress_level, pack_textures, workers, split_mode, stats=None):
+    """Write one file per object or per collection, next to filepath.
+
+    Each file gets its own material table. Snapshots are taken here, the
+    files are formatted and written concurrently by mqo_writer.write_files.
+    """
+    if stats is None:
+        stats = Stats("export")
+    directory = os.path.dirname(filepath)
+    ext = ".mqoz" if mqoz else ".mqo"
+    used_names = set()
+    with stats.phase("analyze"):
+        analyses = mesh_analyses(objects, edge)
+
+    def jobs():
+        for name, group in split_objects(objects, split_mode):
+            stem = bpy.path.clean_name(name)
+            unique = stem
+            count = 1
+            while unique.lower() in used_names:
+                unique = "%s.%03d" % (stem, count)
+                count += 1
+            used_names.add(unique.lower())
+            path = os.path.join(directory, unique + ext)
+            with stats.phase("materials"):
+                version, materials, mat_maps, textures = prepare_document(op, group, no_ngons, edge, mat_exp,
+                                                                          pack_textures, analyses)
+            stats.count("materials", len(materials or ()))
+            records = list(iter_snapshots(op, group, mat_maps, rot90, no_ngons, edge, scale, mod_exp, analyses,
+                                          stats))
+            if not records:
+                continue
+            yield (path, version, materials, records, invert, uv_exp, uv_cor, bvertex, 1, mqoz, compress_level,
+                   textures, None, document_encoding(group, materials))
+
+    with _write_phase(stats):
+        written, failed = mqo_writer.write_files(jobs(), None if workers == 0 else workers)
+    for path in written:
+        msg = ".mqo export: Created %s" % path
         print(msg)
         op.report({'INFO'}, msg)
-      
-        inte_mat = 0
-        tmp_mat = []
-        obj_tmp = []
-        total_ngons = 0
-    
-        for ob in objects:
-            inte_mat, obj_tmp, ngons = exp_obj(op, obj_tmp, ob, rot90, invert, no_ngons, edge, uv_exp, uv_cor, scale, mat_exp, inte_mat, tmp_mat, mod_exp)
-        
-        total_ngons += ngons
-        if no_ngons:
-            version = 1.0
+        stats.count("files")
+        stats.count("bytes_written", os.path.getsize(path))
+    for path, e in failed:
+        msg = ".mqo export: Failed to write %s: %s" % (path, e)
+        print(msg)
+        op.report({'ERROR'}, msg)
+    msg = ".mqo export: Export finished. Created %i files in %s" % (len(written), directory)
+    if failed:
+        msg += ", %i failed" % len(failed)
+    print(msg,"\n")
+    op.report({'INFO'}, msg)
+
+
+def document_encoding(objects, materials):
+    """UTF-8 with a CodePage line when an object or material name isn't
+    ASCII, the document is unchanged otherwise.
+    """
+    return mqo_writer.document_encoding([ob.name for ob in objects] + list(materials or ()))
+
+
+def split_objects(objects, split_mode):
+    """Return (name, objects) pairs, one per output file."""
+    if split_mode == 'OBJECT':
+        return [(ob.name, [ob]) for ob in objects]
+    groups = {}
+    for ob in objects:
+        collections = ob.users_collection
+        name = collections[0].name if collections else "Scene"
+        groups.setdefault(name, []).append(ob)
+    return list(groups.items())
+
+
+def collect_textures(op, images):
+    """Return (arcname, path or bytes) of the images referenced by
+    tex/aplane/bump, to be stored next to the .mqo in a .mqoz.
+    """
+    textures = []
+    written = set()
+    for img in images:
+        arcname = bpy.path.basename(img.filepath)
+        if not arcname or arcname in written:
+            continue
+        path = bpy.path.abspath(img.filepath)
+        if os.path.isfile(path):
+            textures.append((arcname, path))
+        elif img.packed_file is not None:
+            textures.append((arcname, img.packed_file.data))
         else:
-            if total_ngons > 0:
-                version = 1.1
-            else:
-                version = 1.0        
-        fw("Metasequoia Document\nFormat Text Ver %.1f\n\nScene {\n    pos 0.0000 0.0000 1500.0000\n    lookat 0.0000 0.0000 0.0000\n    head -0.5236\n    pich 0.5236\n    bank 0.0000\n    ortho 0\n    zoom2 5.0000\n    amb 0.250 0.250 0.250\n    dirlights 1 {\n        light {\n            dir 0.408 0.408 0.816\n            color 1.000 1.000 1.000\n        }\n    }\n}\n" % (version))
-
-        if mat_exp:        
-            mat_fw(fw, tmp_mat)
-        else: # create default material
-            fw("Material 1 {\n\t\"mat1\" shader(3) col(1.000 1.000 1.000 1.000) dif(0.800) amb(0.600) emi(0.000) spc(0.000) power(5.00)\n}\n")
-   
-        for data in obj_tmp:
-            fw(data)
-    
-        fw("Eof\n")
-        msg = ".mqo export: Export finished. Created %s" % filepath
-        print(msg,"\n")
+            msg = ".mqo export: Texture not found: %s" % path
+            print(msg)
+            op.report({'WARNING'}, msg)
+            continue
+        written.add(arcname)
+        msg = ".mqo export: added texture %s" % arcname
+        print(msg)
         op.report({'INFO'}, msg)
-    return
-    
-def exp_obj(op, fw, ob, rot90, invert, no_ngons, edge, uv_exp, uv_cor, scale, mat_exp, inte_mat, tmp_mat, mod_exp):
+    return textures
+
+
+def skip_object(ob, edge):
+    return len(ob.data.polygons) == 0 and not edge
+
+
+class MeshAnalysis:
+    """Facts about a mesh computed once per export and shared by the header
+    pre-scan, the snapshot and the triangulation.
+
+    loop_total  array('i') corner count of every polygon
+    sizes       Counter of polygon sizes (3: triangles, 4: quads, ...)
+    ngons       number of polygons with more than 4 corners
+    users       exported objects still to snapshot with this mesh
+
+    The loose edges and the triangle-by-polygon index are only computed
+    when they are asked for, and only once.
+    """
+    __slots__ = ("me", "edge", "loop_total", "sizes", "ngons", "users",
+                 "_loose_edges", "_triangles")
+
+    def __init__(self, me, edge):
+        self.me = me
+        self.edge = edge
+        self.loop_total = _int_buffer(len(me.polygons))
+        me.polygons.foreach_get("loop_total", self.loop_total)
+        self.sizes = Counter(self.loop_total)
+        self.ngons = sum(count for size, count in self.sizes.items() if size > 4)
+        self.users = 0
+        self._loose_edges = None
+        self._triangles = None
+
+    def loose_edges(self):
+        """Vertex pairs of the edges not used by any polygon."""
+        if self._loose_edges is None:
+            me = self.me
+            loose_edges = array('i')
+            n_edges = len(me.edges)
+            if self.edge and n_edges:
+                me.update(calc_edges_loose=True)
+                loose = array('b', bytes(n_edges))
+                me.edges.foreach_get("is_loose", loose)
+                if any(loose):
+                    edge_verts = _int_buffer(2 * n_edges)
+                    me.edges.foreach_get("vertices", edge_verts)
+                    for i in compress(range(n_edges), loose):
+                        loose_edges.extend(edge_verts[2 * i:2 * i + 2])
+            self._loose_edges = loose_edges
+        return self._loose_edges
+
+    def triangles(self):
+        """Return (tri_loops, tri_start), the loops of every loop triangle
+        and for polygon p the range tri_start[p]:tri_start[p + 1] of its
+        triangles.
+        """
+        if self._triangles is None:
+            me = self.me
+            me.calc_loop_triangles()
+            n_tris = len(me.loop_triangles)
+            tri_loops = _int_buffer(3 * n_tris)
+            me.loop_triangles.foreach_get("loops", tri_loops)
+            tri_poly = _int_buffer(n_tris)
+            me.loop_triangles.foreach_get("polygon_index", tri_poly)
+            # triangles are grouped by polygon, count them and accumulate
+            per_poly = Counter(tri_poly)
+            tri_start = array('i', [0])
+            tri_start.extend(accumulate(per_poly[p] for p in range(len(self.loop_total))))
+            self._triangles = tri_loops, tri_start
+        return self._triangles
+
+
+def mesh_analyses(objects, edge):
+    """Analyze every mesh once, also when several objects share it."""
+    analyses = {}
+    for ob in objects:
+        key = ob.data.as_pointer()
+        info = analyses.get(key)
+        if info is None:
+            info = analyses[key] = MeshAnalysis(ob.data, edge)
+        info.users += 1
+    return analyses
+
+
+def iter_snapshots(op, objects, mat_maps, rot90, no_ngons, edge, scale, mod_exp, analyses, stats=None):
+    if stats is None:
+        stats = Stats("export")
+    for ob, mat_map in zip(objects, mat_maps):
+        key = ob.data.as_pointer()
+        info = analyses[key]
+        with stats.phase("snapshot"):
+            rec = exp_obj(op, ob, rot90, no_ngons, edge, scale, mat_map, mod_exp, info)
+        info.users -= 1
+        if info.users == 0:
+            # the snapshot holds what is needed, free the triangle index
+            del analyses[key]
+        if rec is not None:
+            stats.count_object(rec)
+            if no_ngons and info.ngons:
+                stats.count("ngons_triangulated", info.ngons)
+            # material indices are already global
+            yield rec, 0
+
+
+def exp_obj(op, ob, rot90, no_ngons, edge, scale, mat_map, mod_exp, info):
     me = ob.data
-    facecount, ngons = getFacesCount(me)
-    if facecount == 0 and not edge:
-        return inte_mat, fw, ngons
+    if skip_object(ob, edge):
+        return None
+    mod = []
     if mod_exp:
-        mod = modif(op, ob.modifiers)
-    #fw("Object \"%s\" {\n\tdepth 0\n\tfolding 0\n\tscale %.6f %.6f %.6f\n\trotation %.6f %.6f %.6f\n\ttranslation %.6f %.6f %.6f\n\tvisible 15\n\tlocking 0\n\tshading 1\n\tfacet 59.5\n\tcolor 0.898 0.498 0.698\n\tcolor_type 0\n" % (me.name, scale[0], scale[1], scale[2], 180*rotat.x/pi, 180*rotat.y/pi, 180*rotat.z/pi, loca[0], loca[1], loca[2]))
-    fw.append("Object \"%s\" {\n\tdepth 0\n\tfolding 0\n\tscale 1 1 1\n\trotation 0 0 0\n\ttranslation 0 0 0\n\tvisible 15\n\tlocking 0\n\tshading 1\n\tfacet 59.5\n\tcolor 0.898 0.498 0.698\n\tcolor_type 0\n" % (ob.name))
-    for mod_fw in mod:
-        fw.append(mod_fw)
-    
-    msg = ".mqo export: Exporting obj=\"%s\" inte_mat=%i" %(ob.name, inte_mat)
+        mod = modif(op, ob.modifiers, rot90)
+
+    msg = ".mqo export: Exporting obj=\"%s\"" % ob.name
     print(msg)
     op.report({'INFO'}, msg)
-    inte_mat_obj = inte_mat
-    if mat_exp:
-        for mat in me.materials:
-            inte_mat = mat_extract(op, mat, tmp_mat, inte_mat)
-                
-    fw.append("\tvertex %i {\n"% (len(me.vertices)))
-    e = mathutils.Euler()
-    e.rotate_axis('X', math.radians(-90))
-    m = e.to_matrix()
-    for v in me.vertices:
-        if rot90:
-            # rotate -90 degrees about X axis
-            vv = m @ v.co #new syntax, was m*v.co
-            fw.append("\t\t%.5f %.5f %.5f\n" % (vv[0]*scale, vv[1]*scale, vv[2]*scale))
+
+    rec = snapshot_mesh(me, ob.name, rot90, scale, info, no_ngons and info.ngons > 0, mat_map)
+    rec.attrs = mod
+    return rec
+
+
+def _int_buffer(length):
+    return array('i', bytes(4 * length))
+
+
+def _float_buffer(length):
+    return array('f', bytes(4 * length))
+
+
+def snapshot_mesh(me, name, rot90, scale, info, triangulate, mat_map=None):
+    """Copy the mesh data needed by the exporter into a MQOObject.
+
+    Everything is read with foreach_get into contiguous buffers so the
+    serializer never touches the RNA layer. Coordinates are converted to
+    Metasequoia axis and scale, ngons are split into their loop triangles
+    when triangulate is set and edges only keep the loose ones. mat_map
+    gives the index in the Material chunk of every material slot.
+    """
+    rec = MQOObject(name)
+    rec.coords = _float_buffer(3 * len(me.vertices))
+    me.vertices.foreach_get("co", rec.coords)
+    # rotate -90 degrees about X axis and scale the whole block at once
+    transform_coords(rec.coords, rot90, scale, inverse=True)
+
+    n_faces = len(me.polygons)
+    loop_verts = _int_buffer(len(me.loops))
+    me.loops.foreach_get("vertex_index", loop_verts)
+    loop_start = _int_buffer(n_faces)
+    me.polygons.foreach_get("loop_start", loop_start)
+    loop_total = info.loop_total
+    mat_index = _int_buffer(n_faces)
+    me.polygons.foreach_get("material_index", mat_index)
+    if mat_map and mat_map != array('i', range(len(mat_map))):
+        last = len(mat_map) - 1
+        mat_index = array('i', [mat_map[min(i, last)] for i in mat_index])
+
+    uvs = array('f')
+    uv_layer = me.uv_layers.active
+    if uv_layer is not None:
+        # u v of every loop in one call
+        uvs = _float_buffer(2 * len(me.loops))
+        uv_layer.data.foreach_get("uv", uvs)
+
+    rec.edges = info.loose_edges()
+
+    if triangulate:
+        loop_start, loop_total, mat_index, corners = triangulate_ngons(
+            info, loop_start, loop_total, mat_index)
+        loop_verts = array('i', gather(loop_verts, corners))
+        if uvs:
+            uvs = array('f', gather(uvs, corners, 2))
+
+    rec.loop_verts = loop_verts
+    rec.loop_start = loop_start
+    rec.loop_total = loop_total
+    rec.mat_index = mat_index
+    rec.uvs = uvs
+    return rec
+
+
+def triangulate_ngons(info, loop_start, loop_total, mat_index):
+    """Replace the faces with more than 4 corners by their loop triangles.
+
+    Returns new loop_start, loop_total and mat_index arrays and the mesh
+    loop index of every corner. The triangles of a polygon come straight
+    from the index of the mesh analysis, nothing is searched.
+    """
+    tri_loops, tri_start = info.triangles()
+
+    corners = array('i')
+    new_start = array('i')
+    new_total = array('i')
+    new_mat = array('i')
+    for p, (start, total, mat) in enumerate(zip(loop_start, loop_total, mat_index)):
+        if total < 5:
+            new_start.append(len(corners))
+            new_total.append(total)
+            new_mat.append(mat)
+            corners.extend(range(start, start + total))
         else:
-            fw.append("\t\t%.5f %.5f %.5f\n" % (v.co[0]*scale, v.co[1]*scale, v.co[2]*scale))
-    fw.append("\t}\n")
-    
-    #me.update(False, True)
-    me.update(calc_edges_loose=True)
-    #faces = me.tessfaces #Mesh.tessfaces not exist in 2.80 api
-    lostEdges = 0
-    for e in me.edges:
-        if e.is_loose:
-            lostEdges+=1
-    if edge and lostEdges > 0:
-        fw.append("\tface %i {\n" % (facecount+lostEdges))
-        for e in me.edges:
-            if e.is_loose:
-                fw.append("\t\t2 V(%i %i)\n" % (e.vertices[0], e.vertices[1]))
-    else:
-        fw.append("\tface %i {\n" % (facecount))
-    
-    #me.update(False, True)
-    me.update(calc_edges_loose=True)
-    me.calc_loop_triangles()
-    if (no_ngons==False) or (ngons==0):
-        faces = me.polygons
-    else:
-        faces = []
-        for f in me.polygons:
-            if len(f.vertices) < 5:
-                faces.append(f)
-            else:
-                tris = [tri for tri in me.loop_triangles if tri.polygon_index == f.index]
-                faces.extend(tris)
-
-    for f in faces:
-        vs = f.vertices
-        if len(f.vertices) == 3:
-            if invert:
-                fw.append("\t\t3 V(%d %d %d)" % (vs[0], vs[2], vs[1]))
-            else:
-                fw.append("\t\t3 V(%d %d %d)" % (vs[0], vs[1], vs[2]))
-        if len(f.vertices) == 4:
-            if invert:
-                fw.append("\t\t4 V(%d %d %d %d)" % (vs[0], vs[3], vs[2], vs[1]))
-            else:
-                fw.append("\t\t4 V(%d %d %d %d)" % (vs[0], vs[1], vs[2], vs[3]))
-        if len(f.vertices) > 4:
-            count = len(f.vertices)  
-            if invert:
-                vs=[idx for idx in vs]
-                vs.reverse()
-                vs.insert(0,vs.pop())
-            fw.append("\t\t%d V(" % (count))
-            for i in range(count):
-                fw.append("%d" % vs[i])
-                if i < count:
-                    fw.append(" ")
-            fw.append(")")
-        fw.append(" M(%d)" % (f.material_index+inte_mat_obj))
-        
-        try:
-            #data = me.tessface_uv_textures.active.data[f.index]
-            uv_layer = me.uv_layers.active.data
-            uvs =[]
-            if hasattr(f,"loop_indices"): #polygons
-                for loop_index in f.loop_indices:
-                    uvs.append(uv_layer[loop_index].uv)
-            else:
-                for loop_index in f.loops: #loop_triangles
-                    uvs.append(uv_layer[loop_index].uv)
-            if (uv_exp) and (uvs):
-                if not invert:
-                    if len(f.vertices) == 3:
-                        if uv_cor:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], 1-uvs[0][1], uvs[1][0], 1-uvs[1][1], uvs[2][0], 1-uvs[2][1]))
-                        else:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], uvs[0][1], uvs[1][0], uvs[1][1], uvs[2][0], uvs[2][1]))
-                    if len(f.vertices) == 4:
-                        if uv_cor:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], 1-uvs[0][1], uvs[1][0], 1-uvs[1][1], uvs[2][0], 1-uvs[2][1], uvs[3][0], 1-uvs[3][1]))
-                        else:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], uvs[0][1], uvs[1][0], uvs[1][1], uvs[2][0], uvs[2][1], uvs[3][0], uvs[3][1]))
-                    if len(f.vertices) > 4:
-                        fw.append(" UV(")
-                        for uv in uvs:
-                            if uv != uvs[-1]:
-                                s=" "
-                            else:
-                                s=""
-                            if uv_cor:
-                                fw.append("%.5f %.5f%s"%(uv[0],1-uv[1],s))
-                            else:
-                                fw.append("%.5f %.5f%s"%(uv[0],uv[1],s))
-                        fw.append(")")
-                else:
-                    if len(f.vertices) == 3:
-                        if uv_cor:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], 1-uvs[0][1], uvs[2][0], 1-uvs[2][1], uvs[1][0], 1-uvs[1][1]))
-                        else:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], uvs[0][1], uvs[2][0], uvs[2][1], uvs[1][0], uvs[1][1]))
-                    if len(f.vertices) == 4:
-                        if uv_cor:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], 1-uvs[0][1], uvs[3][0], 1-uvs[3][1], uvs[2][0], 1-uvs[2][1], uvs[1][0], 1-uvs[1][1]))
-                        else:
-                            fw.append(" UV(%.5f %.5f %.5f %.5f %.5f %.5f %.5f %.5f)" % (uvs[0][0], uvs[0][1], uvs[3][0], uvs[3][1], uvs[2][0], uvs[2][1], uvs[1][0], uvs[1][1]))
-                    if len(f.vertices) > 4:
-                        uvs.reverse()
-                        uvs.insert(0,uvs.pop())
-                        fw.append(" UV(")
-                        for uv in uvs:
-                            if uv != uvs[-1]:
-                                s=" "
-                            else:
-                                s=""
-                            if uv_cor:
-                                fw.append("%.5f %.5f%s"%(uv[0],1-uv[1],s))
-                            else:
-                                fw.append("%.5f %.5f%s"%(uv[0],uv[1],s))
-                        fw.append(")")                   
-        except AttributeError:
-            #pass
-            msg="No UVs exported due AttributeError exception"
-            print(msg)
-            op.report({'INFO'}, msg)
-        
-        fw.append("\n")
-    fw.append("\t}\n")
+            for t in range(tri_start[p], tri_start[p + 1]):
+                new_start.append(len(corners))
+                new_total.append(3)
+                new_mat.append(mat)
+                corners.extend(tri_loops[3 * t:3 * t + 3])
+    return new_start, new_total, new_mat, corners
 
-    fw.append("}\n")
-    return inte_mat, fw, ngons
-    
-    
-def mat_extract(op, mat, tmp, index):
+
+class MaterialRegistry:
+    """Material table of one output file.
+
+    Every material datablock is extracted once and keeps its index in the
+    Material chunk whatever the number of objects using it.
+    """
+    __slots__ = ("op", "lines", "images", "index")
+
+    def __init__(self, op):
+        self.op = op
+        self.lines = []
+        self.images = []
+        self.index = {}
+
+    def slot_map(self, materials):
+        """Return array('i') with the global index of every material slot.
+        Empty slots use the first material.
+        """
+        result = array('i')
+        for mat in materials:
+            if mat is None:
+                result.append(0)
+                continue
+            key = mat.as_pointer()
+            i = self.index.get(key)
+            if i is None:
+                i = self.index[key] = len(self.lines)
+                mat_extract(self.op, mat, self.lines, i, self.images)
+            result.append(i)
+        return result
+
+
+def mat_extract(op, mat, tmp, index, images=None):
     #FIXME: bit of a hack, I don't know enough about materials in Blender
     #FIXME: should probably use bpy_extras.node_shader_utils but module not documented in current api docs!!!!
     # assumes at most one diffuse texture node ("Color" socket) connected to shader node or output node
@@ -262,6 +507,7 @@ def mat_extract(op, mat, tmp, index):
     alpha = ''
     diffuse = ''
     bump = ''
+    used = []
     msg = ".mqo export: added mat %s / index #%i" % (mat.name,index)
     print(msg)
     op.report({'INFO'}, msg)
@@ -272,27 +518,41 @@ def mat_extract(op, mat, tmp, index):
         tmp.append(l+"\n")
         return index + 1
     
-    nodes = mat.node_tree.nodes
-    output_nodes = [n for n in nodes if n.bl_idname == "ShaderNodeOutputMaterial" and n.inputs["Surface"].is_linked]
+    # one pass over the node tree
+    output_nodes = []
+    tex_nodes = []
+    alpha_nodes = []
+    for n in mat.node_tree.nodes:
+        if n.bl_idname == "ShaderNodeOutputMaterial":
+            if n.inputs["Surface"].is_linked:
+                output_nodes.append(n)
+        elif n.bl_idname == "ShaderNodeTexImage":
+            if n.outputs["Color"].is_linked:
+                tex_nodes.append(n)
+            if n.outputs["Alpha"].is_linked:
+                alpha_nodes.append(n)
     if not output_nodes:
         tmp.append(l+"\n")
         return index + 1
 
-    tex_nodes = [n for n in nodes if n.bl_idname == "ShaderNodeTexImage" and n.outputs["Color"].is_linked]
     for tn in tex_nodes:
         if tn.outputs["Color"].links[0].to_node.bl_idname != "ShaderNodeOutputMaterial":
             diffuse = bpy.path.basename(tn.image.filepath)
+            used.append(tn.image)
             break
 
-    alpha_nodes = [n for n in nodes if n.bl_idname == "ShaderNodeTexImage" and n.outputs["Alpha"].is_linked]
     if len(alpha_nodes)==1:
         alpha = bpy.path.basename(alpha_nodes[0].image.filepath)
+        used.append(alpha_nodes[0].image)
 
     #assume one only output node
     if output_nodes[0].inputs["Displacement"].is_linked:
         if output_nodes[0].inputs["Displacement"].links[0].from_node.bl_idname == "ShaderNodeTexImage":
             bump = bpy.path.basename(output_nodes[0].inputs["Displacement"].links[0].from_node.image.filepath)
+            used.append(output_nodes[0].inputs["Displacement"].links[0].from_node.image)
 
+    if images is not None:
+        images.extend(used)
     if diffuse: 
         l = l + " tex(\"" + diffuse + "\")"
     if alpha:
@@ -303,51 +563,25 @@ def mat_extract(op, mat, tmp, index):
     return index + 1
     
     
-def mat_fw(fw, tmp):
-    fw("Material %d {\n" % (len(tmp)))
-    for mat in tmp:
-        fw("%s" % (mat))
-    fw("}\n")
-    
-def modif(op, modifiers):
+def modif(op, modifiers, rot90=False):
     tmp = []
-    axis = 0
     for mod in modifiers.values():
         if mod.type == "MIRROR":
             msg = ".mqo export: exporting mirror"
             print(msg)
             op.report({'INFO'}, msg)
+            use_x, use_y, use_z = mod.use_axis
+            if rot90:
+                # Blender Y and Z axes are Metasequoia Z and Y axes
+                use_y, use_z = use_z, use_y
+            axis = use_x | use_y << 1 | use_z << 2
             if mod.use_mirror_merge:
-                tmp.append("\tmirror 2\n\tmirror_dis %.3f\n" % mod.merge_threshold)
+                tmp.append("\tmirror 2\n\tmirror_axis %i\n\tmirror_dis %.3f\n" % (axis, mod.merge_threshold))
             else:
-                tmp.append("\tmirror 1\n")
-            if mod.use_x:
-                axis = 1
-            if mod.use_y:
-                axis = axis + 2
-            if mod.use_z:
-                axis = axis + 4
+                tmp.append("\tmirror 1\n\tmirror_axis %i\n" % axis)
         if mod.type == "SUBSURF":
             msg = ".mqo export: exporting subsurf" 
             print(msg)
             op.report({'INFO'}, msg)
             tmp.append("\tpatch 3\n\tpatchtri 0\n\tsegment %i\n" % mod.render_levels)
     return tmp
-
-def getFacesCount(msh):
-    quads=0
-    tris=0
-    ngons=0
-    for f in msh.polygons:
-        vcount = len(f.vertices)
-        if vcount==3:
-            tris += 1
-        elif vcount==4:
-            quads += 1
-        else:
-            ngons += 1
-    if ngons==0:
-        return len(msh.polygons), ngons
-    msh.calc_loop_triangles()
-    ngon_tris = len(msh.loop_triangles) - (2*quads) - tris
-    return quads + tris + ngon_tris, ngons
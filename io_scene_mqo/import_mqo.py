@@ -36,20 +36,64 @@ base source from :
 http://wiki.blender.org/index.php/Dev:2.5/Py/Scripts/Cookbook/Code_snippets/Multi-File_packages#Simple_obj_import
 """
 
-import bpy, os, math, mathutils, struct
+import bpy, io, os, mmap
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from . import mqo_cache, mqo_parser
+from .mqo_math import flip_v, gather, scatter, unpack_colors
+from .mqo_parser import dprint
+from .mqo_stats import Stats, finish
+
+# below this size a process pool costs more than it saves
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+# custom property holding the content hash of an imported material
+MATERIAL_KEY = "mqo_hash"
 
-def dprint(string, debug=False):
-    if debug:
-        print("\t",string)
-    return
 
-def open_mqo(op, filepath, rot90, scale, debug):
+def open_mqo(op, filepath, rot90, scale, debug, workers=1, cache_dir=None, cache_size=mqo_cache.DEFAULT_MAX_BYTES,
+             uv_cor=True, vertex_data=False, stats_path=None):
+    """Import one .mqo or .mqoz file. Returns the Stats of the import, which
+    are also written to stats_path when it is set.
+    """
+    stats = Stats("import")
+    key = None
+    collected = None
+    materials = []
+    directory = os.path.dirname(os.path.realpath(os.path.expanduser(filepath)))
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    stats.count("bytes_read", os.path.getsize(filepath))
+    if cache_dir is not None:
+        with stats.phase("cache"):
+            key = mqo_cache.file_key(filepath, rot90, scale, vertex_data)
+            cached = mqo_cache.load(cache_dir, key)
+        if cached is not None:
+            msg = ".mqo import: Using cached parse of %s" % filepath
+            print(msg)
+            op.report({'INFO'}, msg)
+            stats.count("cache_hits")
+            materials, records = cached
+            import_records(op, records, debug, uv_cor, materials, directory, rot90, stats, stem)
+            finish(op, stats, stats_path)
+            return stats
+        collected = []
+
+    parallel = workers != 1
     if filepath.suffix.lower() in [".mqo"]:
         name = os.path.basename(filepath)
         realpath = os.path.realpath(os.path.expanduser(filepath))
-        with open(realpath, 'rb') as fp:
+        with open(realpath, 'rb', buffering=mqo_parser.READ_BUFFER) as fp:
             dprint('Importing %s' % realpath, debug) 
-            import_mqo(op, fp, rot90, scale, debug)
+            if parallel and os.fstat(fp.fileno()).st_size >= PARALLEL_MIN_BYTES:
+                with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    records = mqo_parser.iter_objects_parallel(op, data, rot90, scale, debug, workers or None, materials,
+                                                               vertex_data)
+                    import_records(op, _collect(records, collected, stats), debug, uv_cor, materials, directory,
+                                   rot90, stats, stem)
+            else:
+                records = mqo_parser.iter_objects(op, fp, rot90, scale, debug, materials, vertex_data)
+                import_records(op, _collect(records, collected, stats), debug, uv_cor, materials, directory,
+                               rot90, stats, stem)
     else:
         mqo_file = None
         import zipfile
@@ -60,204 +104,157 @@ def open_mqo(op, filepath, rot90, scale, debug):
                 if ext.lower() in [".mqo"]:
                     mqo_file = zinfo
                     break
-            if mqo_file:
-                with zfile.open(mqo_file) as fp:
+            if mqo_file and parallel and mqo_file.file_size >= PARALLEL_MIN_BYTES:
+                dprint('Importing %s' % filepath, debug)
+                with stats.phase("read"):
+                    data = zfile.read(mqo_file)
+                records = mqo_parser.iter_objects_parallel(op, data, rot90, scale, debug, workers or None, materials,
+                                                           vertex_data)
+                import_records(op, _collect(records, collected, stats), debug, uv_cor, materials, directory,
+                               rot90, stats, stem)
+            elif mqo_file:
+                with io.BufferedReader(zfile.open(mqo_file), mqo_parser.READ_BUFFER) as fp:
                     dprint('Importing %s' % filepath, debug)
-                    import_mqo(op, fp, rot90, scale, debug)
-                    # import_mqo(op, tw(fp), rot90, scale, debug)
+                    records = mqo_parser.iter_objects(op, fp, rot90, scale, debug, materials, vertex_data)
+                    import_records(op, _collect(records, collected, stats), debug, uv_cor, materials, directory,
+                                   rot90, stats, stem)
             else:
                 msg = ".mqo Import: No mqo file in mqoz file"
                 dprint(msg, debug)
-                op.report({'ERROR', msg})
-    
-def import_mqo(op, fp, rot90, scale, debug):
-    e = mathutils.Euler()
-    e.rotate_axis('X', math.radians(90))
-    m = e.to_matrix()
-    verts = []
-    faces = []
-    edges = []
-    texverts = []
-    texfaces = []
-    obj = False
-    mat = False
-    mat_nb = 0
-    v = False
-    v_nb = 0
-    vb = False
-    obj_name = ""
-    obj_count = 0
-    f = False
-    f_nb = 0
-    shift_jis = False
+                op.report({'ERROR'}, msg)
+                return stats
+
+    if key is not None:
+        with stats.phase("cache"):
+            error = mqo_cache.store(cache_dir, key, materials, collected, cache_size)
+        if error is not None:
+            msg = ".mqo import: %s" % error
+            print(msg)
+            op.report({'WARNING'}, msg)
+    finish(op, stats, stats_path)
+    return stats
+
 
-    for bytesline in fp:
+def _collect(records, collected, stats):
+    """Pass the records on, keeping them in collected for the cache. The time
+    spent reading and parsing them is added to the stats.
+    """
+    for rec in stats.timed("parse", records):
+        if collected is not None:
+            collected.append(rec)
+        yield rec
+
+
+def open_mqo_files(op, filepaths, rot90, scale, debug, workers=1, cache_dir=None,
+                   cache_size=mqo_cache.DEFAULT_MAX_BYTES, uv_cor=True, vertex_data=False, stats_path=None):
+    """Import several files, parsed by a process pool unless workers is 1.
+
+    Meshes are built on the main thread as soon as a file is parsed and a
+    single summary is reported at the end. Materials identical to one
+    already imported, from any of the files, are reused. Returns the Stats
+    of the whole batch, also written to stats_path when it is set.
+    """
+    stats = Stats("import")
+    known = known_materials()
+
+    def import_file(pth, materials, records):
+        dprint('Importing %s' % pth, debug)
+        stats.count("files")
+        stats.count("bytes_read", os.path.getsize(pth))
+        with stats.phase("materials"):
+            table = material_table(op, materials, os.path.dirname(os.path.realpath(str(pth))), known)
+        stats.count("materials", len(materials))
+        objects = [import_object(op, rec, debug, uv_cor, table, rot90, stats) for rec in records]
+        imported[pth] = [ob for ob in objects if ob is not None]
+        return len(imported[pth])
+
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(filepaths))
+    obj_count = 0
+    failed = []
+    pending = list(filepaths)
+    # file -> its objects, they are linked once every file is imported
+    imported = {}
+    if cache_dir is None:
+        parse_file = mqo_parser.parse_file
+        options = (rot90, scale, vertex_data)
+    else:
+        parse_file = mqo_cache.parse_file
+        options = (rot90, scale, cache_dir, cache_size, vertex_data)
+    if workers > 1:
         try:
-            line = bytesline.decode()
-        except UnicodeDecodeError:
-            try:
-                # dprint(bytesline, debug)
-                msg = ".mqo import: Unknown character encoding found. Trying shift_jis. Import may be unsuccessful"
-                print(msg)
-                op.report({'WARNING'}, msg)
-                shift_jis = True
-                line = bytesline.decode(encoding='shift_jis')
-            except UnicodeDecodeError:
-                msg = ".mqo import: Character encoding not 'shift_jis'. Trying ignoring errors. Import may be unsuccessful"
-                print(msg)
-                op.report({'WARNING'}, msg)
-                shift_jis = False
-                line = bytesline.decode(errors = 'replace')
-        words = line.split()
-        if len(words) == 0:                     ##Nothing
-            pass    
-        elif words[0] == "}":                       ##end of mat or obj
-            dprint('end something', debug)
-            if obj:                             ##if end of obj import it in blender
-                if v:
-                    v=False
-                    dprint('end of vertex', debug)
-                elif vb:
-                    vb=False
-                    dprint('end of Bvertex', debug)
-                elif f:
-                    f=False
-                    dprint('end of face', debug)
-                else:
-                    dprint('end of obj. importing :"%s"' % obj_name, debug)
-                    if verts and faces:
-                        nm = obj_name
-                        if shift_jis:
-                            nm = "obj" # need to rename object and mesh since shift_jis chars not supported in my Blender!
-                        me = bpy.data.meshes.new(nm)
-                        me.from_pydata(verts, [], faces)
-                        me.update()
-                        # scn = bpy.context.scene
-                        ob = bpy.data.objects.new(nm, me)
-                        view_layer = bpy.context.view_layer
-                        collection = view_layer.active_layer_collection.collection
-                        collection.objects.link(ob)
-                        obj_count += 1
-                        view_layer.update()
-                        # scn.collection.objects.link(ob)
-                        #TODO replace following line with 2.80 api
-                        #scn.objects.active = ob
-                    else:
-                        if not verts and not faces:
-                            s = "vertices or faces"
-                        elif not verts:
-                            s = "vertices"
-                        else:
-                            s = "faces"
-                        msg = ".mqo import: Object \"%s\" ignored. No %s found" % (obj_name, s)
-                        print(msg)
-                        op.report({'WARNING'}, msg)
-
-                    obj = False
-                    v = False
-                    v_nb = 0
-                    obj_name = ""
-                    f = False
-                    f_nb = 0
-                    verts = []
-                    faces = []
-                    texverts = []
-                    texfaces = []
-            if mat:                             ##if end of mat import later in obj
-                dprint('end of mat', debug)
-                mat = False
-                
-        elif words[0] == 'Object':              ##detect an object
-            dprint('begin of obj :%s' % words[1], debug)
-            obj = True
-            obj_name = words[1].strip('"')
-        elif words[0] == 'Material':            ##detect materials
-            dprint('begin of mat', debug)
-            mat = True
-            mat_nb = int(words[1].strip('"'))
-        elif obj and words[0] == "vertex":      ##detect vertex when obj
-            dprint('begin of ver', debug)
-            v = True
-            v_nb = int(words[1])
-        elif obj and words[0] == "BVertex":
-            vb = True
-            v_nb = int(words[1])
-            v_bytes = int(fp.readline().decode().split()[-1].strip("[]"))
-            #dprint('nl=%s' % fp.readline(), debug)
-            for i in range(v_nb):
-                tmp = struct.unpack("<fff", fp.read(4*3))
-                dprint('tmp = %s' % str(tmp), debug)
-                if rot90:
-                    V = mathutils.Vector(tmp)
-                    vv = m @ V
-                    verts.append( (scale*vv.x, scale*vv.y, scale*vv.z) )
-                else:
-                    verts.append( (scale*tmp[0], scale*tmp[1], scale*tmp[2]) )
-                v_nb -= 1 
-                if v_nb == 0:
-                    #v = False
-                    dprint('end of vertex?', debug)
-        elif obj and (words[0] =="weit" or words[0] =="color") and (v or vb):
-            bracecount=1
-            while bracecount > 0:
-                tmp = fp.readline()
-                if tmp.find(b"{") != -1:
-                    bracecount += 1
-                if tmp.find(b"}") != -1:
-                    bracecount -= 1
-        elif obj and words[0] == "vertexattr":
-            bracecount=1
-            for aline in fp:
-                if aline.find(b"{") !=-1:
-                    bracecount +=1
-                if aline.find(b"}") !=-1:
-                    bracecount -=1
-                if bracecount == 0:
-                    break
-        elif obj and v and v_nb != 0:           ##get vertex coor when vertex and obj
-            dprint('found a vertex', debug)
-            (x,y,z) = (float(words[0]), float(words[1]), float(words[2]))
-            if rot90:
-                V = mathutils.Vector((x,y,z))
-                vv = m @ V #m*V new syntax
-                verts.append( (scale*vv.x, scale*vv.y, scale*vv.z) )
-            else:
-                verts.append( (scale*x, scale*y, scale*z) )
-            v_nb = v_nb -1
-            if v_nb == 0:                       
-                #v = False
-                dprint('end of vertex?', debug)
-        elif obj and words[0] == "face":        ##detect face when obj
-            dprint('begin of face', debug)
-            f = True
-            f_nb = int(words[1])
-        elif obj and f and f_nb != 0:           ##get face vertex
-            dprint('found a face', debug)
-            if int(words[0]) == 2:
-                edges.append((int(words[1].strip('V(')), int(words[2].strip(')'))))
-            elif int(words[0]) == 3:
-                faces.append((int(words[1].strip('V(')), int(words[2]), int(words[3].strip(')'))))
-            elif int(words[0]) == 4:
-                faces.append((int(words[1].strip('V(')), int(words[2]), int(words[3]), int(words[4].strip(')'))))
-            else:
-                dprint('face with %s vertex' % words[0], debug)
-                num = int(words[0])
-                v_indices = []
-                for idx in range(1, num+1):
-                    if idx == 1:
-                        v_indices.append(int(words[idx].strip('V(')))
-                    elif idx == num:
-                        v_indices.append(int(words[idx].strip(')')))
-                    else:
-                        v_indices.append(int(words[idx]))
-                faces.append(tuple(v_indices))
-            f_nb = f_nb -1
-            if f_nb ==0:
-                #f= False
-                dprint('end of face?', debug)
-        else:
-            dprint('don\'t know what is it', debug)          
-    
+            with ProcessPoolExecutor(workers) as executor:
+                futures = {executor.submit(parse_file, str(pth), *options): pth
+                           for pth in filepaths}
+                # the parsing runs in the pool, the wait for it is timed
+                for future in stats.timed("parse", as_completed(futures)):
+                    pth = futures[future]
+                    pending.remove(pth)
+                    try:
+                        materials, records = future.result()
+                    except BrokenProcessPool:
+                        pending.append(pth)
+                        raise
+                    except Exception as e:
+                        failed.append((pth, e))
+                        continue
+                    obj_count += import_file(pth, materials, records)
+        except (OSError, BrokenProcessPool) as e:
+            msg = ".mqo import: Parallel parsing failed (%s). Parsing in Blender" % e
+            print(msg)
+            op.report({'WARNING'}, msg)
+    for pth in pending:
+        try:
+            with stats.phase("parse"):
+                materials, records = parse_file(str(pth), *options)
+        except Exception as e:
+            failed.append((pth, e))
+            continue
+        obj_count += import_file(pth, materials, records)
+    link_objects([(os.path.splitext(os.path.basename(pth))[0], imported[pth])
+                  for pth in filepaths if pth in imported], stats)
+
+    for pth, e in failed:
+        msg = ".mqo import: Failed to import %s: %s" % (pth, e)
+        print(msg)
+        op.report({'WARNING'}, msg)
+    msg = ".mqo import: Import finished. %i objects imported from %i of %i files" % (
+        obj_count, len(filepaths) - len(failed), len(filepaths))
+    print(msg, "\n")
+    op.report({'INFO'} if obj_count else {'ERROR'}, msg)
+    finish(op, stats, stats_path)
+    return stats
+
+
+def import_mqo(op, fp, rot90, scale, debug, uv_cor=True, directory="", vertex_data=False, name="mqo"):
+    materials = []
+    records = mqo_parser.iter_objects(op, fp, rot90, scale, debug, materials, vertex_data)
+    import_records(op, records, debug, uv_cor, materials, directory, rot90, name=name)
+
+
+def import_records(op, records, debug, uv_cor=True, materials=(), directory="", rot90=True, stats=None, name="mqo"):
+    """Build Blender objects from MQOObject records, on the main thread.
+
+    materials is the list of MQOMaterial of the document, it may be filled
+    by the records generator until the first object comes out. The objects
+    are linked into a new collection called name once they are all built.
+    """
+    if stats is None:
+        stats = Stats("import")
+    objects = []
+    table = None
+    for rec in records:
+        if table is None:
+            with stats.phase("materials"):
+                table = material_table(op, materials, directory)
+            stats.count("materials", len(materials))
+        ob = import_object(op, rec, debug, uv_cor, table, rot90, stats)
+        if ob is not None:
+            objects.append(ob)
+    link_objects([(name, objects)], stats)
+    obj_count = len(objects)
+
     msg = ".mqo import: Import finished"
     print(msg, "\n")
     op.report({'INFO'}, msg)
@@ -267,4 +264,270 @@ def import_mqo(op, fp, rot90, scale, debug):
         op.report({'ERROR'}, msg)
 
     return
- 
\ No newline at end of file
+
+
+def import_object(op, rec, debug, uv_cor=True, materials=(), rot90=True, stats=None):
+    """Return a new object built from rec, not linked to any collection yet,
+    or None when rec has no geometry.
+    """
+    dprint('end of obj. importing :"%s"' % rec.name, debug)
+    if not rec.num_verts or not (rec.num_faces or rec.num_edges):
+        if not rec.num_verts and not rec.num_faces:
+            s = "vertices or faces"
+        elif not rec.num_verts:
+            s = "vertices"
+        else:
+            s = "faces"
+        msg = ".mqo import: Object \"%s\" ignored. No %s found" % (rec.name, s)
+        print(msg)
+        op.report({'WARNING'}, msg)
+        if stats is not None:
+            stats.count("skipped_objects")
+        return None
+
+    if stats is None:
+        stats = Stats("import")
+    nm = rec.name
+    if rec.shift_jis:
+        nm = "obj" # need to rename object and mesh since shift_jis chars not supported in my Blender!
+    with stats.phase("build"):
+        me = build_mesh(nm, rec, uv_cor, materials)
+    with stats.phase("link"):
+        ob = bpy.data.objects.new(nm, me)
+    with stats.phase("build"):
+        if rec.attrs:
+            add_modifiers(ob, rec.attrs, rot90, debug)
+        if rec.weit_verts:
+            add_weights(ob, rec)
+    stats.count_object(rec)
+    return ob
+
+
+def link_objects(groups, stats=None):
+    """Link the objects of every (name, objects) pair of groups into a new
+    collection called name, under the active collection.
+
+    Linking is done once all the objects exist, the previous selection is
+    replaced by the new objects, the last one becomes active and the view
+    layer is updated once for everything.
+    """
+    groups = [(name, objects) for name, objects in groups if objects]
+    if not groups:
+        return
+    if stats is None:
+        stats = Stats("import")
+    view_layer = bpy.context.view_layer
+    with stats.phase("link"):
+        parent = view_layer.active_layer_collection.collection
+        for ob in view_layer.objects:
+            ob.select_set(False)
+        for name, objects in groups:
+            collection = bpy.data.collections.new(name)
+            parent.children.link(collection)
+            for ob in objects:
+                collection.objects.link(ob)
+                ob.select_set(True)
+        view_layer.objects.active = groups[-1][1][-1]
+    with stats.phase("update"):
+        view_layer.update()
+
+
+def add_modifiers(ob, attrs, rot90=True, debug=False):
+    """Turn the mirror and patch attributes of the Object chunk into live
+    MIRROR and SUBSURF modifiers, the reverse of export_mqo.modif.
+    """
+    values = {}
+    for attr in attrs:
+        words = attr.split()
+        if len(words) == 2:
+            values[words[0]] = words[1]
+    try:
+        mirror = int(values.get("mirror", 0))
+        # X when the axis is not written, like Metasequoia
+        axis = int(values.get("mirror_axis", 1))
+        mirror_dis = float(values["mirror_dis"]) if "mirror_dis" in values else None
+        patch = int(values.get("patch", 0))
+        segment = int(values.get("segment", 1))
+    except ValueError:
+        dprint('bad modifier attribute in %s' % attrs, debug)
+        return
+    if mirror:
+        dprint('mirror %i axis %i' % (mirror, axis), debug)
+        mod = ob.modifiers.new("Mirror", 'MIRROR')
+        use_x, use_y, use_z = bool(axis & 1), bool(axis & 2), bool(axis & 4)
+        if rot90:
+            # Metasequoia Y and Z axes are Blender Z and Y axes
+            use_y, use_z = use_z, use_y
+        mod.use_axis = (use_x, use_y, use_z)
+        # mirror 2 connects the two halves
+        mod.use_mirror_merge = mirror == 2
+        if mirror_dis is not None:
+            mod.merge_threshold = mirror_dis
+    if patch:
+        # spline 1 / 2 and Catmull-Clark all become a subdivision surface
+        dprint('patch %i segment %i' % (patch, segment), debug)
+        mod = ob.modifiers.new("Subdivision", 'SUBSURF')
+        mod.levels = mod.render_levels = min(max(segment, 0), 11)
+
+
+def add_weights(ob, rec):
+    """Put the weit chunk in a "weit" vertex group, with one add() call for
+    all the vertices sharing a weight.
+    """
+    by_weight = {}
+    num_verts = rec.num_verts
+    for i, weight in zip(rec.weit_verts, rec.weits):
+        if 0 <= i < num_verts:
+            by_weight.setdefault(weight, []).append(i)
+    group = ob.vertex_groups.new(name="weit")
+    for weight, indices in by_weight.items():
+        group.add(indices, weight, 'REPLACE')
+
+
+def add_colors(me, rec):
+    """Put the color chunk in a "color" color attribute. Vertices not in the
+    chunk are white.
+    """
+    # the color of a color attribute is scene linear, the file holds sRGB
+    # bytes like the vertex colors of older Blender versions
+    linear = hasattr(me, "color_attributes")
+    colors = array('f', [1.0]) * (4 * rec.num_verts)
+    scatter(colors, rec.color_verts, unpack_colors(rec.colors, linear), 4)
+    if linear:
+        layer = me.color_attributes.new("color", 'BYTE_COLOR', 'POINT')
+        layer.data.foreach_set("color", colors)
+    elif rec.num_loops:
+        # before Blender 3.2 vertex colors are stored per face corner
+        layer = me.vertex_colors.new(name="color")
+        layer.data.foreach_set("color", array('f', gather(colors, rec.loop_verts, 4)))
+
+
+def build_mesh(name, rec, uv_cor=True, materials=()):
+    """Create a mesh from the flat buffers of a MQOObject.
+
+    Every element array is allocated once and filled with foreach_set,
+    the 2 vertex faces become loose edges. With uv_cor the V of the UV is
+    inverted, Metasequoia V axis is the opposite of Blender one. materials
+    are the Blender materials of the document in file order.
+    """
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(rec.num_verts)
+    me.vertices.foreach_set("co", rec.coords)
+    if rec.num_edges:
+        me.edges.add(rec.num_edges)
+        me.edges.foreach_set("vertices", rec.edges)
+    if rec.num_faces:
+        me.loops.add(rec.num_loops)
+        me.loops.foreach_set("vertex_index", rec.loop_verts)
+        me.polygons.add(rec.num_faces)
+        me.polygons.foreach_set("loop_start", rec.loop_start)
+        me.polygons.foreach_set("loop_total", rec.loop_total)
+        if len(rec.uvs) == 2 * rec.num_loops:
+            uv_layer = me.uv_layers.new(name="UVMap")
+            # flip_v returns a copy, the record may still go to the parse cache
+            uv_layer.data.foreach_set("uv", flip_v(rec.uvs) if uv_cor else rec.uvs)
+        if rec.mat_index:
+            assign_materials(me, rec.mat_index, materials)
+    if rec.color_verts:
+        add_colors(me, rec)
+    # edges first so validate doesn't have to rebuild them for every face,
+    # indices come straight from the file, don't let a broken one crash Blender
+    me.update(calc_edges=True)
+    me.validate(clean_customdata=False)
+    return me
+
+
+def assign_materials(me, mat_index, materials):
+    """Give the mesh a slot for every material used by its faces and set
+    all the face material indices with one foreach_set.
+    """
+    used = sorted(set(mat_index))
+    if all(i < 0 or i >= len(materials) for i in used):
+        return
+    slots = {}
+    empty = None
+    for i in used:
+        if 0 <= i < len(materials):
+            slots[i] = len(me.materials)
+            me.materials.append(materials[i])
+        else:
+            # faces without a valid material share an empty slot
+            if empty is None:
+                empty = len(me.materials)
+                me.materials.append(None)
+            slots[i] = empty
+    if used != list(range(len(used))):
+        mat_index = array('i', [slots[i] for i in mat_index])
+    me.polygons.foreach_set("material_index", mat_index)
+
+
+def known_materials():
+    """Map the content hash of every material made by an import to it."""
+    return {mat[MATERIAL_KEY]: mat for mat in bpy.data.materials if MATERIAL_KEY in mat}
+
+
+def material_table(op, materials, directory, known=None):
+    """Return the Blender material of every MQOMaterial.
+
+    A material with the same content as one imported before (known, by
+    default the materials of bpy.data) is reused instead of duplicated.
+    """
+    if known is None:
+        known = known_materials()
+    table = []
+    for mqo_mat in materials:
+        key = mqo_mat.digest(directory)
+        mat = known.get(key)
+        if mat is None:
+            mat = new_material(op, mqo_mat, directory)
+            mat[MATERIAL_KEY] = key
+            known[key] = mat
+        table.append(mat)
+    return table
+
+
+def new_material(op, mqo_mat, directory):
+    """Create a material laid out the way the exporter reads it back:
+    tex() drives the base color, aplane() the alpha and bump() the
+    displacement of the output node.
+    """
+    nm = mqo_mat.name
+    if mqo_mat.shift_jis:
+        nm = "mat"
+    mat = bpy.data.materials.new(nm)
+    mat.diffuse_color = mqo_mat.color
+    mat.specular_intensity = mqo_mat.spc
+    if not (mqo_mat.tex or mqo_mat.aplane or mqo_mat.bump):
+        return mat
+
+    mat.use_nodes = True
+    tree = mat.node_tree
+    output = next(n for n in tree.nodes if n.bl_idname == "ShaderNodeOutputMaterial")
+    shader = output.inputs["Surface"].links[0].from_node
+    if "Base Color" in shader.inputs:
+        shader.inputs["Base Color"].default_value = mqo_mat.color
+    for filename, output_name, socket in ((mqo_mat.tex, "Color", shader.inputs.get("Base Color")),
+                                          (mqo_mat.aplane, "Alpha", shader.inputs.get("Alpha")),
+                                          (mqo_mat.bump, "Color", output.inputs["Displacement"])):
+        if not filename or socket is None:
+            continue
+        image = load_image(op, os.path.join(directory, filename))
+        if image is None:
+            continue
+        node = tree.nodes.new("ShaderNodeTexImage")
+        node.image = image
+        tree.links.new(node.outputs[output_name], socket)
+    if mqo_mat.aplane:
+        mat.blend_method = 'BLEND'
+    return mat
+
+
+def load_image(op, path):
+    try:
+        # an image already loaded from the same file is reused
+        return bpy.data.images.load(path, check_existing=True)
+    except RuntimeError:
+        msg = ".mqo import: Texture not found: %s" % path
+        print(msg)
+        op.report({'WARNING'}, msg)
+        return None
@@ -0,0 +1,270 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Content addressed on-disk cache of parsed MQO files.
+
+An entry is keyed by the SHA-256 of the file content plus the import
+options and stores the parsed MQOMaterial and MQOObject in a small binary format
+(no pickle), so a cache hit skips the text parsing completely. The cache is
+bounded in size, the least recently used entries are removed first.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from .mqo_parser import (MQOMaterial, MQOObject, iter_objects, open_document,
+                         report)
+
+MAGIC = b"MQOC"
+# bump when the stored data or the parser output changes
+FORMAT_VERSION = 5
+EXTENSION = ".mqoc"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def default_cache_dir():
+    path = os.environ.get("MQO_CACHE_DIR")
+    if path:
+        return path
+    base = (os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "io_scene_mqo")
+
+
+def file_key(filepath, rot90, scale, vertex_data=False):
+    """Return the cache key of a file parsed with the given options."""
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(("|%i|%r|%i|%i|%s|%s|%s" % (
+        rot90, float(scale), vertex_data, FORMAT_VERSION, sys.byteorder,
+        ",".join(MQOObject.__slots__),
+        ",".join(MQOMaterial.__slots__))).encode())
+    return h.hexdigest()
+
+
+def load(cache_dir, key):
+    """Return the cached (materials, objects) lists for key, or None on a
+    miss.
+    """
+    path = os.path.join(cache_dir, key + EXTENSION)
+    try:
+        with open(path, 'rb') as fp:
+            data = fp.read()
+    except OSError:
+        return None
+    try:
+        result = _decode(data)
+    except (ValueError, struct.error, UnicodeDecodeError):
+        # damaged or from an older version, parse again
+        _remove(path)
+        return None
+    try:
+        # the modification time is the last use for the LRU eviction
+        os.utime(path)
+    except OSError:
+        pass
+    return result
+
+
+def store(cache_dir, key, materials, objects, max_bytes=DEFAULT_MAX_BYTES):
+    """Add an entry for key. Return None, or the error message when the
+    cache can't be written: the cache only saves time, an import never
+    fails because of it.
+    """
+    path = os.path.join(cache_dir, key + EXTENSION)
+    tmp = "%s.%i.tmp" % (path, os.getpid())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, 'wb') as fp:
+            _encode(fp.write, materials, objects)
+        os.replace(tmp, path)
+    except OSError as e:
+        _remove(tmp)
+        return "Can't write the parse cache (%s)" % e
+    evict(cache_dir, max_bytes)
+    return None
+
+
+def parse_file(filepath, rot90=True, scale=1.0, cache_dir=None,
+               max_bytes=DEFAULT_MAX_BYTES, vertex_data=False):
+    """mqo_parser.parse_file going through the cache."""
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    key = file_key(filepath, rot90, scale, vertex_data)
+    result = load(cache_dir, key)
+    if result is None:
+        materials = []
+        with open_document(filepath) as fp:
+            objects = list(iter_objects(None, fp, rot90, scale,
+                                        materials=materials,
+                                        vertex_data=vertex_data))
+        error = store(cache_dir, key, materials, objects, max_bytes)
+        if error is not None:
+            report(None, 'WARNING', ".mqo import: %s" % error)
+        result = materials, objects
+    return result
+
+
+def entries(cache_dir):
+    """Return (path, size, mtime) of every entry, least recently used first."""
+    result = []
+    try:
+        it = os.scandir(cache_dir)
+    except OSError:
+        return result
+    with it:
+        for entry in it:
+            if entry.name.endswith(EXTENSION) and entry.is_file():
+                st = entry.stat()
+                result.append((entry.path, st.st_size, st.st_mtime))
+    result.sort(key=lambda e: e[2])
+    return result
+
+
+def cache_info(cache_dir=None):
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    found = entries(cache_dir)
+    return {"directory": cache_dir,
+            "entries": len(found),
+            "bytes": sum(size for path, size, mtime in found)}
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    found = entries(cache_dir)
+    total = sum(size for path, size, mtime in found)
+    for path, size, mtime in found:
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def clear_cache(cache_dir=None):
+    """Remove every entry, return the number of removed entries."""
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    found = entries(cache_dir)
+    for path, size, mtime in found:
+        _remove(path)
+    return len(found)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# values are tagged with one byte, arrays are stored as raw native bytes
+
+def _encode(fw, materials, objects):
+    fw(MAGIC)
+    for items in (materials, objects):
+        fw(struct.pack("<I", len(items)))
+        for item in items:
+            for slot in type(item).__slots__:
+                _encode_value(fw, getattr(item, slot))
+
+
+def _encode_value(fw, value):
+    if isinstance(value, array):
+        raw = value.tobytes()
+        fw(b"A" + value.typecode.encode() + struct.pack("<Q", len(raw)))
+        fw(raw)
+    elif isinstance(value, bool):
+        fw(b"B" + struct.pack("<?", value))
+    elif isinstance(value, int):
+        fw(b"I" + struct.pack("<q", value))
+    elif isinstance(value, float):
+        fw(b"F" + struct.pack("<d", value))
+    elif isinstance(value, str):
+        raw = value.encode()
+        fw(b"S" + struct.pack("<I", len(raw)) + raw)
+    elif isinstance(value, (list, tuple)):
+        fw(b"L" + struct.pack("<I", len(value)))
+        for item in value:
+            _encode_value(fw, item)
+    elif value is None:
+        fw(b"N")
+    else:
+        raise TypeError("can't cache %r" % type(value))
+
+
+def _decode(data):
+    view = memoryview(data)
+    if bytes(view[:4]) != MAGIC:
+        raise ValueError("not a mqo cache entry")
+    pos = 4
+    result = []
+    for cls in (MQOMaterial, MQOObject):
+        count, = struct.unpack_from("<I", view, pos)
+        pos += 4
+        items = []
+        for i in range(count):
+            item = cls()
+            for slot in cls.__slots__:
+                value, pos = _decode_value(view, pos)
+                setattr(item, slot, value)
+            items.append(item)
+        result.append(items)
+    if pos != len(view):
+        raise ValueError("trailing data in mqo cache entry")
+    return tuple(result)
+
+
+def _decode_value(view, pos):
+    tag = view[pos:pos + 1].tobytes()
+    pos += 1
+    if tag == b"A":
+        typecode = view[pos:pos + 1].tobytes().decode()
+        size, = struct.unpack_from("<Q", view, pos + 1)
+        pos += 9
+        value = array(typecode)
+        value.frombytes(view[pos:pos + size])
+        return value, pos + size
+    if tag == b"B":
+        return struct.unpack_from("<?", view, pos)[0], pos + 1
+    if tag == b"I":
+        return struct.unpack_from("<q", view, pos)[0], pos + 8
+    if tag == b"F":
+        return struct.unpack_from("<d", view, pos)[0], pos + 8
+    if tag == b"S":
+        size, = struct.unpack_from("<I", view, pos)
+        pos += 4
+        return view[pos:pos + size].tobytes().decode(), pos + size
+    if tag == b"L":
+        count, = struct.unpack_from("<I", view, pos)
+        pos += 4
+        items = []
+        for i in range(count):
+            item, pos = _decode_value(view, pos)
+            items.append(item)
+        return items, pos
+    if tag == b"N":
+        return None, pos
+    raise ValueError("unknown tag %r in mqo cache entry" % tag)
@@ -0,0 +1,297 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Command line tools working on .mqo/.mqoz files without Blender.
+
+    python -m io_scene_mqo stat FILE...            objects and their sizes
+    python -m io_scene_mqo validate FILE...        check face and material indices
+    python -m io_scene_mqo convert IN OUT          rewrite as text/BVertex, .mqo/.mqoz
+
+Only the bpy-free parser and writer are used, bpy is never imported.
+Messages of the parser go to stderr so the output can be piped.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import zipfile
+from collections import Counter
+
+from . import mqo_parser, mqo_writer
+
+
+def parse(path, vertex_data=True):
+    """Return (materials, objects) of path, in file coordinates."""
+    with contextlib.redirect_stdout(sys.stderr):
+        return mqo_parser.parse_file(path, rot90=False, scale=1.0,
+                                     vertex_data=vertex_data)
+
+
+def object_stats(rec):
+    sizes = Counter(rec.loop_total)
+    return {"name": rec.name,
+            "verts": rec.num_verts,
+            "faces": rec.num_faces,
+            "triangles": sizes[3],
+            "quads": sizes[4],
+            "ngons": rec.num_faces - sizes[3] - sizes[4],
+            "loops": rec.num_loops,
+            "edges": rec.num_edges,
+            "uv": bool(rec.uvs),
+            "weights": len(rec.weit_verts),
+            "colors": len(rec.color_verts),
+            "attrs": [attr.strip() for attr in rec.attrs]}
+
+
+def file_stats(path):
+    materials, objects = parse(path)
+    return {"file": path,
+            "bytes": os.path.getsize(path),
+            "materials": [mat.name for mat in materials],
+            "objects": [object_stats(rec) for rec in objects]}
+
+
+def validate_object(rec, num_materials):
+    """Return (errors, warnings) lists of messages about rec."""
+    # what the parser dropped or found inconsistent
+    errors = list(rec.errors)
+    warnings = []
+    num_verts = rec.num_verts
+    for label, indices in (("face", rec.loop_verts), ("edge", rec.edges)):
+        bad = 0
+        if indices and (min(indices) < 0 or max(indices) >= num_verts):
+            bad = sum(1 for i in indices if i < 0 or i >= num_verts)
+        if bad:
+            errors.append("%i %s vertex indices out of range (%i vertices)"
+                          % (bad, label, num_verts))
+    if rec.mat_index and max(rec.mat_index) >= num_materials:
+        bad = sum(1 for i in rec.mat_index if i >= num_materials)
+        errors.append("%i faces use a material out of range (%i materials)"
+                      % (bad, num_materials))
+    bad = sum(1 for i in rec.weit_verts if i < 0 or i >= num_verts)
+    bad += sum(1 for i in rec.color_verts if i < 0 or i >= num_verts)
+    if bad:
+        errors.append("%i weit/color vertex indices out of range" % bad)
+    loop_verts = rec.loop_verts
+    repeated = sum(1 for start, total in zip(rec.loop_start, rec.loop_total)
+                   if len(set(loop_verts[start:start + total])) != total)
+    if repeated:
+        warnings.append("%i faces use a vertex more than once" % repeated)
+    if not num_verts or not (rec.num_faces or rec.num_edges):
+        warnings.append("no geometry, the importer ignores it")
+    return errors, warnings
+
+
+# what parse raises for a missing or unreadable file
+PARSE_ERRORS = (OSError, ValueError, EOFError, zipfile.BadZipFile)
+
+
+def validate_file(path):
+    """Return (errors, warnings) lists of messages about the file."""
+    try:
+        materials, objects = parse(path)
+    except PARSE_ERRORS as e:
+        return ["can't be parsed: %s" % e], []
+    errors = []
+    warnings = []
+    if not objects:
+        errors.append("no Object chunk")
+    for rec in objects:
+        obj_errors, obj_warnings = validate_object(rec, len(materials))
+        errors.extend('object "%s": %s' % (rec.name, msg) for msg in obj_errors)
+        warnings.extend('object "%s": %s' % (rec.name, msg) for msg in obj_warnings)
+    return errors, warnings
+
+
+def convert(src, dst, binary=False, compress_level=6):
+    """Write the content of src to dst. The output is a .mqoz archive when
+    dst ends with .mqoz, with BVertex vertices when binary is set. The
+    textures of the materials go into (or come out of) the archive.
+    Object attributes and material lines are copied as read.
+    """
+    materials, objects = parse(src, vertex_data=False)
+    mqoz = dst.lower().endswith(".mqoz")
+    textures = _textures(src, materials)
+    if not mqoz:
+        directory = os.path.dirname(os.path.abspath(dst))
+        for arcname, data in textures:
+            path = os.path.join(directory, *arcname.split("/"))
+            # files from an archive are extracted, never overwritten
+            if isinstance(data, bytes) and not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+        textures = []
+    version = 1.1 if any(max(rec.loop_total, default=0) > 4 for rec in objects) else 1.0
+    lines = [_material_line(mat) for mat in materials]
+    # a Shift-JIS document stays one, names aren't turned into UTF-8
+    encoding = mqo_writer.document_encoding(
+        lines + [rec.name for rec in objects]
+        + [attr for rec in objects for attr in rec.attrs],
+        any(item.shift_jis for item in materials + objects))
+    mqo_writer.write_file(dst, version, lines,
+                          [(rec, 0) for rec in objects], False, True, False,
+                          binary, 1, mqoz, compress_level, textures, None,
+                          encoding)
+    return len(objects)
+
+
+def _material_line(mat):
+    """The line of mat as read, so fields the parser skips (shader(),
+    dbls(), vcol(), ...) are kept.
+    """
+    if mat.line:
+        return "\t%s\n" % mat.line
+    return mqo_writer.format_material(mat)
+
+
+def _texture_name(name):
+    """Return name with "/" separators, or None when it is absolute or goes
+    up with "..": a texture is only looked for under the document folder.
+    """
+    name = name.replace("\\", "/")
+    parts = name.split("/")
+    if (not name or name.startswith("/") or os.path.splitdrive(name)[0]
+            or ".." in parts):
+        return None
+    return name
+
+
+def _textures(src, materials):
+    """Return (arcname, path or bytes) of the texture files of materials
+    found next to src or in the src archive. Names which are absolute or
+    go up with ".." are left out.
+    """
+    names = set()
+    for mat in materials:
+        for name in (mat.tex, mat.aplane, mat.bump):
+            name = _texture_name(name)
+            if name is not None:
+                names.add(name)
+    result = []
+    if src.lower().endswith(".mqoz"):
+        with zipfile.ZipFile(src) as zfile:
+            members = {zinfo.filename: zinfo for zinfo in zfile.infolist()}
+            for name in sorted(names):
+                if name in members:
+                    result.append((name, zfile.read(members[name])))
+        return result
+    directory = os.path.dirname(os.path.abspath(src))
+    for name in sorted(names):
+        path = os.path.join(directory, *name.split("/"))
+        if os.path.isfile(path):
+            result.append((name, path))
+    return result
+
+
+def cmd_stat(args):
+    status = 0
+    results = []
+    for path in args.files:
+        try:
+            results.append(file_stats(path))
+        except PARSE_ERRORS as e:
+            print("%s: error: can't be parsed: %s" % (path, e), file=sys.stderr)
+            status = 1
+    if args.json:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+        return status
+    for result in results:
+        objects = result["objects"]
+        print("%s: %i bytes, %i materials, %i objects" % (
+            result["file"], result["bytes"], len(result["materials"]), len(objects)))
+        for ob in objects:
+            print('  "%s": %i verts, %i faces (%i tris, %i quads, %i ngons), '
+                  '%i loops, %i edges%s%s' % (
+                      ob["name"], ob["verts"], ob["faces"], ob["triangles"], ob["quads"],
+                      ob["ngons"], ob["loops"], ob["edges"], ", uv" if ob["uv"] else "",
+                      ", %i weights" % ob["weights"] if ob["weights"] else ""))
+        if len(objects) > 1:
+            print("  total: %i verts, %i faces, %i loops, %i edges" % tuple(
+                sum(ob[key] for ob in objects) for key in ("verts", "faces", "loops", "edges")))
+    return status
+
+
+def cmd_validate(args):
+    status = 0
+    for path in args.files:
+        errors, warnings = validate_file(path)
+        if args.strict:
+            errors, warnings = errors + warnings, []
+        for msg in errors:
+            print("%s: error: %s" % (path, msg))
+        for msg in warnings:
+            print("%s: warning: %s" % (path, msg))
+        if errors:
+            status = 1
+        elif not args.quiet:
+            print("%s: ok" % path)
+    return status
+
+
+def cmd_convert(args):
+    if os.path.abspath(args.src) == os.path.abspath(args.dst):
+        print("convert: the output must be another file", file=sys.stderr)
+        return 2
+    try:
+        count = convert(args.src, args.dst, args.bvertex, args.compress_level)
+    except PARSE_ERRORS as e:
+        print("%s: error: can't be parsed: %s" % (args.src, e), file=sys.stderr)
+        return 1
+    print("%s: %i objects written" % (args.dst, count))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m io_scene_mqo",
+                                     description="Metasequoia file tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stat = commands.add_parser("stat", help="list the objects of files")
+    stat.add_argument("files", nargs="+")
+    stat.add_argument("--json", action="store_true", help="JSON output")
+    stat.set_defaults(func=cmd_stat)
+
+    validate = commands.add_parser("validate", help="check files, exit "
+                                   "status 1 when one has errors")
+    validate.add_argument("files", nargs="+")
+    validate.add_argument("--strict", action="store_true",
+                          help="treat warnings as errors")
+    validate.add_argument("-q", "--quiet", action="store_true",
+                          help="only print problems")
+    validate.set_defaults(func=cmd_validate)
+
+    conv = commands.add_parser("convert", help="rewrite a file, .mqo or "
+                               ".mqoz after the output extension")
+    conv.add_argument("src")
+    conv.add_argument("dst")
+    conv.add_argument("--bvertex", action="store_true",
+                      help="binary BVertex vertices (default: text)")
+    conv.add_argument("--compress-level", type=int, default=6,
+                      choices=range(10), metavar="0-9",
+                      help="deflate level of a .mqoz output")
+    conv.set_defaults(func=cmd_convert)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
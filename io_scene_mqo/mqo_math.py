@@ -0,0 +1,191 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Whole block operations on flat coordinate buffers.
+
+Blender up axis is Z but Metasequoia up axis is Y. Instead of multiplying a
+mathutils.Vector by a rotation matrix for every vertex, the axis correction
+and the scale are applied once to the flat x y z array of an object.
+NumPy is used when it is available (it ships with Blender), otherwise the
+same operation is done with array slices.
+"""
+
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def transform_coords(coords, rot90, scale, inverse=False):
+    """Apply the up axis correction and scale to coords in place.
+
+    coords is a flat array('f') of x y z triples. By default the 90 degrees
+    rotation about X converts Metasequoia to Blender coordinates, with
+    inverse=True the -90 degrees rotation converts Blender to Metasequoia.
+    """
+    if not coords or (not rot90 and scale == 1.0):
+        return coords
+    if numpy is not None:
+        v = numpy.frombuffer(coords, dtype=numpy.float32).reshape(-1, 3)
+        if rot90:
+            y = v[:, 1].copy()
+            if inverse:
+                # (x, y, z) -> (x, z, -y)
+                v[:, 1] = v[:, 2]
+                v[:, 2] = -y
+            else:
+                # (x, y, z) -> (x, -z, y)
+                v[:, 1] = -v[:, 2]
+                v[:, 2] = y
+        if scale != 1.0:
+            v *= scale
+        return coords
+
+    x = coords[0::3]
+    y = coords[1::3]
+    z = coords[2::3]
+    sy = sz = scale
+    if rot90:
+        if inverse:
+            y, z, sz = z, y, -scale
+        else:
+            y, z, sy = z, y, -scale
+    coords[0::3] = _scaled(x, scale)
+    coords[1::3] = _scaled(y, sy)
+    coords[2::3] = _scaled(z, sz)
+    return coords
+
+
+def _scaled(values, factor):
+    if factor == 1.0:
+        return values
+    return array('f', [factor * c for c in values])
+
+
+def face_corners(loop_start, loop_total, invert=False):
+    """Return array('i') with the loop of every face corner in file order.
+
+    Face i is written with the corners sum(loop_total[:i]) up to
+    sum(loop_total[:i + 1]) of the result. With invert the first corner of
+    every face is kept and the others are reversed, which flips the winding
+    of all the faces at once.
+    """
+    corners = array('i')
+    if numpy is not None:
+        start = numpy.frombuffer(loop_start, dtype=numpy.intc)
+        total = numpy.frombuffer(loop_total, dtype=numpy.intc)
+        first = numpy.repeat(start, total)
+        offset = (numpy.arange(len(first), dtype=numpy.intc)
+                  - numpy.repeat(numpy.cumsum(total) - total, total))
+        if invert:
+            offset = numpy.where(offset == 0, 0,
+                                 numpy.repeat(total, total) - offset)
+        corners.frombytes((first + offset).astype(numpy.intc).tobytes())
+        return corners
+    for start, total in zip(loop_start, loop_total):
+        if invert:
+            corners.append(start)
+            corners.extend(range(start + total - 1, start, -1))
+        else:
+            corners.extend(range(start, start + total))
+    return corners
+
+
+def gather(values, indices, width=1):
+    """Return values[i * width:(i + 1) * width] of every index as one list."""
+    if numpy is not None and len(values):
+        v = numpy.frombuffer(values, dtype=numpy.dtype(values.typecode))
+        idx = numpy.frombuffer(indices, dtype=numpy.intc)
+        return v.reshape(-1, width)[idx].ravel().tolist()
+    if width == 1:
+        return [values[i] for i in indices]
+    return [c for i in indices for c in values[i * width:(i + 1) * width]]
+
+
+def corner_uvs(uvs, corners, flip_v=False):
+    """Return the u v of every corner as a flat list, v is replaced by
+    1 - v with flip_v (Blender and Metasequoia V axes are opposite).
+    """
+    result = gather(uvs, corners, 2)
+    if flip_v:
+        result[1::2] = [1 - v for v in result[1::2]]
+    return result
+
+
+def flip_v(uvs):
+    """Return a copy of the flat u v array uvs with v replaced by 1 - v."""
+    result = array('f', uvs)
+    if numpy is not None:
+        uv = numpy.frombuffer(result, dtype=numpy.float32).reshape(-1, 2)
+        uv[:, 1] = 1.0 - uv[:, 1]
+        return result
+    result[1::2] = array('f', [1.0 - v for v in result[1::2]])
+    return result
+
+
+def scatter(target, indices, values, width=1):
+    """Set target[i * width:(i + 1) * width] for every index to the matching
+    values, indices out of range are ignored.
+    """
+    count = len(target) // width
+    if numpy is not None and len(indices):
+        t = numpy.frombuffer(target, dtype=numpy.dtype(target.typecode))
+        idx = numpy.frombuffer(indices, dtype=numpy.intc)
+        v = numpy.frombuffer(values, dtype=numpy.dtype(values.typecode))
+        n = min(len(idx), len(v) // width)
+        idx = idx[:n]
+        keep = (idx >= 0) & (idx < count)
+        t.reshape(-1, width)[idx[keep]] = v[:n * width].reshape(-1, width)[keep]
+        return target
+    for k, i in enumerate(indices[:len(values) // width]):
+        if 0 <= i < count:
+            target[i * width:(i + 1) * width] = values[k * width:(k + 1) * width]
+    return target
+
+
+def _srgb_to_linear(c):
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+# value of every byte, as is and converted from sRGB to scene linear
+_BYTE_VALUES = [c / 255.0 for c in range(256)]
+_LINEAR_VALUES = [_srgb_to_linear(c / 255.0) for c in range(256)]
+
+
+def unpack_colors(colors, linear=False):
+    """Return array('f') r g b a in 0..1 of 0xAABBGGRR integer colors.
+
+    The bytes are sRGB, with linear r g b are converted to scene linear,
+    alpha is left as is.
+    """
+    raw = colors[:]
+    if sys.byteorder != "little":
+        raw.byteswap()
+    # in memory the bytes of 0xAABBGGRR are r g b a
+    data = raw.tobytes()
+    table = _LINEAR_VALUES if linear else _BYTE_VALUES
+    values = array('f', [table[c] for c in data])
+    if linear:
+        values[3::4] = array('f', [_BYTE_VALUES[c] for c in data[3::4]])
+    return values
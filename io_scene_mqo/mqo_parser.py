@@ -0,0 +1,653 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Streaming Metasequoia (*.mqo) parser.
+
+This module does not use bpy so it can be run, profiled and tested outside
+of Blender. The file is read line by line as bytes and every Object chunk is
+returned as a MQOObject holding flat typed arrays instead of lists of tuples.
+"""
+
+import hashlib
+import io
+import os
+import re
+import sys
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+from .mqo_math import transform_coords
+
+# buffer size of the streams, also the size of the pieces skip_block scans
+READ_BUFFER = 1 << 20
+
+
+class MQOObject:
+    """Geometry of one Object chunk stored in flat typed buffers.
+
+    coords      array('f') x y z of every vertex
+    loop_verts  array('i') vertex index of every face corner
+    loop_start  array('i') index in loop_verts of the first corner of a face
+    loop_total  array('i') number of corners of a face
+    edges       array('i') vertex pairs of the 2 vertex faces
+    mat_index   array('i') material index of every face, -1 for none
+    uvs         array('f') u v of every face corner as written in the file,
+                empty when no face has UV
+    uv_mask     array('B') 1 for the faces with UV and 0 for the ones
+                padded with (0, 0), empty when every face (or none) has UV
+    attrs       list of the attribute lines of the Object chunk (depth,
+                visible, mirror, ...) as written
+    weit_verts  array('i') vertices listed in the weit chunk
+    weits       array('f') their weight
+    color_verts array('i') vertices listed in the color chunk
+    colors      array('I') their color, 0xAABBGGRR
+    errors      list of messages about what the parser found inconsistent
+                or dropped, e.g. a chunk declaring another count than it has
+
+    The weit and color data are only read when asked for (vertex_data).
+    """
+    __slots__ = ("name", "shift_jis", "coords", "loop_verts",
+                 "loop_start", "loop_total", "edges", "mat_index", "uvs",
+                 "uv_mask", "attrs", "weit_verts", "weits", "color_verts",
+                 "colors", "errors")
+
+    def __init__(self, name="", shift_jis=False):
+        self.name = name
+        self.shift_jis = shift_jis
+        self.coords = array('f')
+        self.loop_verts = array('i')
+        self.loop_start = array('i')
+        self.loop_total = array('i')
+        self.edges = array('i')
+        self.mat_index = array('i')
+        self.uvs = array('f')
+        self.uv_mask = array('B')
+        self.attrs = []
+        self.weit_verts = array('i')
+        self.weits = array('f')
+        self.color_verts = array('i')
+        self.colors = array('I')
+        self.errors = []
+
+    @property
+    def num_verts(self):
+        return len(self.coords) // 3
+
+    @property
+    def num_faces(self):
+        return len(self.loop_start)
+
+    @property
+    def num_loops(self):
+        return len(self.loop_verts)
+
+    @property
+    def num_edges(self):
+        return len(self.edges) // 2
+
+
+class MQOMaterial:
+    """One line of the Material chunk.
+
+    color       array('f') r g b a of col()
+    dif ... power  the shading values of the same name
+    tex, aplane, bump  texture file names, empty when not set
+    line        the whole line as written, with the fields not read above
+    """
+    __slots__ = ("name", "shift_jis", "color", "dif", "amb", "emi", "spc",
+                 "power", "tex", "aplane", "bump", "line")
+
+    def __init__(self, name="", shift_jis=False):
+        self.name = name
+        self.shift_jis = shift_jis
+        self.color = array('f', (1.0, 1.0, 1.0, 1.0))
+        self.dif = 0.8
+        self.amb = 0.6
+        self.emi = 0.0
+        self.spc = 0.0
+        self.power = 5.0
+        self.tex = ""
+        self.aplane = ""
+        self.bump = ""
+        self.line = ""
+
+    def digest(self, directory=""):
+        """Content hash of the material. Textures are found relative to
+        the directory of the file so it is part of the hash when used.
+        """
+        # the raw line only differs by fields the importer doesn't use
+        values = [getattr(self, slot) for slot in self.__slots__
+                  if slot != "line"]
+        if self.tex or self.aplane or self.bump:
+            values.append(os.path.normcase(os.path.abspath(directory)))
+        return hashlib.sha256(repr(values).encode()).hexdigest()
+
+
+def report(op, level, msg):
+    print(msg)
+    if op is not None:
+        op.report({level}, msg)
+
+
+def dprint(string, debug=False):
+    if debug:
+        print("\t", string)
+
+
+def decode_name(raw):
+    """Return (name, shift_jis) for the raw bytes of a quoted name."""
+    raw = raw.strip().strip(b'"')
+    try:
+        return raw.decode(), False
+    except UnicodeDecodeError:
+        pass
+    try:
+        return raw.decode(encoding='shift_jis'), True
+    except UnicodeDecodeError:
+        return raw.decode(errors='replace'), False
+
+
+def quoted(line):
+    """Return the bytes between the first and the last double quote."""
+    first = line.find(b'"')
+    last = line.rfind(b'"')
+    if first == -1 or last <= first:
+        words = line.split()
+        return words[1] if len(words) > 1 else b""
+    return line[first + 1:last]
+
+
+def skip_block(fp):
+    """Skip the block opened on the line just read, up to the end of the
+    line of its closing brace.
+
+    A buffered stream is not read line by line: its buffer is searched for
+    braces piece after piece, a BVertex payload on the way is jumped over.
+    """
+    peek = getattr(fp, "peek", None)
+    if peek is None:
+        _skip_lines(fp)
+        return
+    depth = 1
+    payload = 0
+    while True:
+        data = peek(READ_BUFFER)
+        if not data:
+            return
+        if payload:
+            payload -= len(fp.read(min(payload, len(data))))
+            continue
+        limit = data.rfind(b"\n") + 1
+        consumed = limit == 0
+        if consumed:
+            # a line cut by the end of the buffer, a Vector header must
+            # not be split so read it whole
+            data = fp.readline()
+            limit = len(data)
+        pos, depth = _scan_braces(data, 0, limit, depth)
+        if depth == 0:
+            if not consumed:
+                fp.read(pos)
+                fp.readline()
+            return
+        if consumed:
+            payload = pos - limit
+        else:
+            payload = pos - len(fp.read(min(pos, len(data))))
+
+
+def _skip_lines(fp):
+    bracecount = 1
+    for line in fp:
+        bracecount += line.count(b"{") - line.count(b"}")
+        if bracecount <= 0:
+            break
+
+
+def iter_objects(op, fp, rot90=True, scale=1.0, debug=False, materials=None,
+                 vertex_data=False):
+    """Yield a MQOObject for every Object chunk of the binary stream fp.
+
+    When materials is a list the MQOMaterial of the Material chunk are
+    appended to it. The chunk comes first so they are all read before the
+    first object is yielded. The weit and color chunks are read with
+    vertex_data, skipped otherwise.
+    """
+    for line in fp:
+        words = line.split()
+        if not words:
+            continue
+        key = words[0]
+        if key == b"Object":
+            yield parse_object(op, fp, line, rot90, scale, debug, vertex_data)
+        elif key == b"Material" and materials is not None:
+            read_materials(op, fp, materials, debug)
+        elif key == b"Eof":
+            break
+        elif line.rstrip().endswith(b"{"):
+            # Scene, BackImage, ... are not needed
+            dprint('skip chunk %s' % key.decode(errors='replace'), debug)
+            skip_block(fp)
+
+
+# Object attributes turned into Blender modifiers by the importer
+MODIFIER_ATTRS = (b"mirror", b"mirror_axis", b"mirror_dis", b"patch",
+                  b"patchtri", b"segment")
+
+# the header of a BVertex payload which must be jumped over
+_VECTOR_RE = re.compile(rb'Vector[ \t]+\d+[ \t]+\[(\d+)\][^\n]*\n')
+
+
+def scan_blocks(data):
+    """Return (keyword, start, end) of every top level chunk of data.
+
+    data is the whole file as bytes or mmap. Only braces and the BVertex
+    headers are looked at, so this is much faster than parsing.
+    """
+    blocks = []
+    pos = 0
+    size = len(data)
+    while pos < size:
+        nl = data.find(b"\n", pos)
+        line_end = size if nl == -1 else nl + 1
+        line = data[pos:line_end]
+        words = line.split()
+        if words and words[0] == b"Eof":
+            break
+        if words and line.rstrip().endswith(b"{"):
+            end = _block_end(data, line_end)
+            blocks.append((words[0], pos, end))
+            pos = end
+        else:
+            pos = line_end
+    return blocks
+
+
+def _block_end(data, pos):
+    pos, depth = _scan_braces(data, pos, len(data), 1)
+    if depth:
+        return len(data)
+    nl = data.find(b"\n", pos)
+    return len(data) if nl == -1 else nl + 1
+
+
+def _scan_braces(data, pos, limit, depth):
+    """Follow the braces of data[pos:limit] starting at depth.
+
+    Return (pos, 0) with pos just after the brace closing the block, or
+    (pos, depth) when the block goes on after limit; pos is then past
+    limit when a BVertex payload does. Uses find() which is much faster
+    than a regular expression or a loop over lines.
+    """
+    opening = data.find(b"{", pos, limit)
+    closing = data.find(b"}", pos, limit)
+    vector = data.find(b"Vector", pos, limit)
+    while pos < limit:
+        if -1 < opening < pos:
+            opening = data.find(b"{", pos, limit)
+        if -1 < closing < pos:
+            closing = data.find(b"}", pos, limit)
+        if -1 < vector < pos:
+            vector = data.find(b"Vector", pos, limit)
+        found = [i for i in (opening, closing, vector) if i != -1]
+        if not found:
+            return limit, depth
+        nearest = min(found)
+        if nearest == vector:
+            m = _VECTOR_RE.match(data, vector, limit)
+            pos = vector + 6 if m is None else m.end() + int(m.group(1))
+            continue
+        pos = nearest + 1
+        depth += 1 if nearest == opening else -1
+        if depth == 0:
+            return pos, 0
+    return pos, depth
+
+
+def parse_object_block(block, rot90=True, scale=1.0, vertex_data=False):
+    """Parse an Object chunk given as bytes. Used by the worker processes."""
+    fp = io.BufferedReader(io.BytesIO(block), READ_BUFFER)
+    return parse_object(None, fp, fp.readline(), rot90, scale,
+                        vertex_data=vertex_data)
+
+
+def iter_objects_parallel(op, data, rot90=True, scale=1.0, debug=False,
+                          workers=None, materials=None, vertex_data=False):
+    """Like iter_objects but the Object chunks of data are parsed by a
+    process pool. Objects are still yielded in file order.
+    """
+    spans = []
+    for key, start, end in scan_blocks(data):
+        if key == b"Object":
+            spans.append((start, end))
+        elif key == b"Material" and materials is not None:
+            fp = io.BytesIO(data[start:end])
+            fp.readline()
+            read_materials(op, fp, materials, debug)
+    dprint('%i objects found by the pre-pass' % len(spans), debug)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    done = 0
+    if len(spans) > 1 and workers > 1:
+        try:
+            with ProcessPoolExecutor(workers) as executor:
+                blocks = (data[start:end] for start, end in spans)
+                for ob in executor.map(parse_object_block, blocks,
+                                       repeat(rot90), repeat(scale),
+                                       repeat(vertex_data)):
+                    done += 1
+                    yield ob
+        except (OSError, BrokenProcessPool) as e:
+            report(op, 'WARNING', ".mqo import: Parallel parsing failed "
+                   "(%s). Parsing in this process" % e)
+    for start, end in spans[done:]:
+        yield parse_object_block(data[start:end], rot90, scale, vertex_data)
+
+
+def open_document(filepath):
+    """Open the .mqo file, or the first .mqo member of a .mqoz archive,
+    as a binary stream. Raises ValueError for an archive without .mqo.
+    """
+    filepath = str(filepath)
+    if not filepath.lower().endswith(".mqoz"):
+        return open(filepath, 'rb', buffering=READ_BUFFER)
+    zfile = zipfile.ZipFile(filepath)
+    for zinfo in zfile.infolist():
+        if zinfo.filename.lower().endswith(".mqo"):
+            # buffered so skip_block can peek at large pieces
+            fp = io.BufferedReader(zfile.open(zinfo), READ_BUFFER)
+            # the member keeps reading through the archive file handle
+            zfile.close()
+            return fp
+    zfile.close()
+    raise ValueError("No mqo file in mqoz file")
+
+
+def parse_file(filepath, rot90=True, scale=1.0, vertex_data=False):
+    """Parse a whole .mqo/.mqoz file, return (materials, objects).
+    Used by the batch import workers.
+    """
+    materials = []
+    with open_document(filepath) as fp:
+        objects = list(iter_objects(None, fp, rot90, scale, materials=materials,
+                                    vertex_data=vertex_data))
+    return materials, objects
+
+
+def parse_object(op, fp, header, rot90=True, scale=1.0, debug=False,
+                 vertex_data=False):
+    """Parse the body of the Object chunk opened by the header line."""
+    name, shift_jis = decode_name(quoted(header))
+    if shift_jis:
+        report(op, 'WARNING', ".mqo import: Object name is not utf-8. "
+               "Decoded as shift_jis. Import may be unsuccessful")
+    ob = MQOObject(name, shift_jis)
+    dprint('begin of obj :%s' % name, debug)
+    for line in fp:
+        words = line.split()
+        if not words:
+            continue
+        key = words[0]
+        if key == b"}":
+            break
+        elif key == b"vertex":
+            before = ob.num_verts
+            read_vertices(fp, ob.coords)
+            check_count(ob, words, ob.num_verts - before)
+        elif key == b"BVertex":
+            before = ob.num_verts
+            read_bvertices(op, fp, ob, debug, vertex_data)
+            check_count(ob, words, ob.num_verts - before)
+        elif key == b"face":
+            check_count(ob, words, read_faces(op, fp, ob, debug))
+        elif key == b"vertexattr":
+            read_vertex_chunks(op, fp, ob, debug, vertex_data)
+        elif line.rstrip().endswith(b"{"):
+            # other chunks which are not imported
+            dprint('skip chunk %s' % key.decode(errors='replace'), debug)
+            skip_block(fp)
+        else:
+            # kept as written so a rewrite doesn't lose them, the importer
+            # turns MODIFIER_ATTRS into modifiers, mirror_axis is in
+            # Metasequoia axes
+            ob.attrs.append("\t%s\n" % line.strip().decode(errors='replace'))
+    else:
+        ob.errors.append("Object chunk not closed, the file is truncated")
+    transform_coords(ob.coords, rot90, scale)
+    dprint('end of obj :%s' % name, debug)
+    return ob
+
+
+# name(value) fields of a material line, a quoted value may hold ")"
+_MAT_FIELD_RE = re.compile(rb'(\w+)\(("[^"]*"|[^)]*)\)')
+
+
+def read_materials(op, fp, materials, debug=False):
+    """Append a MQOMaterial to materials for every line of the chunk."""
+    for line in fp:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith(b"}"):
+            break
+        if line.endswith(b"{"):
+            skip_block(fp)
+            continue
+        first = line.find(b'"')
+        last = line.find(b'"', first + 1)
+        if first == -1 or last == -1:
+            dprint('material without name', debug)
+            continue
+        name, shift_jis = decode_name(line[first + 1:last])
+        if shift_jis:
+            report(op, 'WARNING', ".mqo import: Material name is not utf-8. "
+                   "Decoded as shift_jis. Import may be unsuccessful")
+        mat = MQOMaterial(name, shift_jis)
+        mat.line = line.decode('shift_jis' if shift_jis else 'utf-8',
+                               errors='replace')
+        for key, value in _MAT_FIELD_RE.findall(line, last + 1):
+            try:
+                if key == b"col":
+                    color = array('f', map(float, value.split()[:4]))
+                    mat.color[:len(color)] = color
+                elif key in (b"dif", b"amb", b"emi", b"spc", b"power"):
+                    setattr(mat, key.decode(), float(value))
+                elif key in (b"tex", b"aplane", b"bump"):
+                    setattr(mat, key.decode(), decode_name(value)[0])
+            except ValueError:
+                dprint('bad value in %s(%s)' % (key.decode(), value.decode(
+                    errors='replace')), debug)
+        materials.append(mat)
+        dprint('material %i :%s' % (len(materials) - 1, name), debug)
+
+
+def check_count(ob, words, found):
+    """Add an error to ob when the chunk header words don't declare the
+    found number of elements.
+    """
+    chunk = words[0].decode()
+    try:
+        declared = int(words[1])
+    except (IndexError, ValueError):
+        ob.errors.append("%s chunk without a count" % chunk)
+        return
+    if declared != found:
+        ob.errors.append("%s chunk declares %i elements but has %i"
+                         % (chunk, declared, found))
+
+
+def read_vertices(fp, coords):
+    extend = coords.extend
+    try:
+        for line in fp:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == b"}":
+                break
+            extend((float(words[0]), float(words[1]), float(words[2])))
+    except IndexError:
+        raise ValueError("vertex with less than 3 coordinates: %r"
+                         % line.strip()) from None
+
+
+def read_bvertices(op, fp, ob, debug, vertex_data=False):
+    # next line is "Vector <count> [<byte count>]" followed by the payload
+    words = fp.readline().split()
+    if len(words) < 3 or words[0] != b"Vector":
+        raise ValueError("BVertex chunk without Vector header")
+    v_nb = int(words[1])
+    v_bytes = int(words[-1].strip(b"[]"))
+    if v_bytes != 12 * v_nb:
+        msg = "BVertex declares %i vertices but %i bytes" % (v_nb, v_bytes)
+        ob.errors.append(msg)
+        report(op, 'WARNING', ".mqo import: %s. Import may be unsuccessful"
+               % msg)
+    # read the whole payload at once and reinterpret it as float32
+    payload = fp.read(v_bytes)
+    if len(payload) != v_bytes:
+        raise EOFError("BVertex payload truncated: %i of %i bytes"
+                       % (len(payload), v_bytes))
+    usable = min(v_bytes, 12 * v_nb) // 12 * 12
+    coords = ob.coords
+    coords.frombytes(memoryview(payload)[:usable])
+    if sys.byteorder != "little":
+        coords.byteswap()
+    dprint('%i binary vertices' % (usable // 12), debug)
+    read_vertex_chunks(op, fp, ob, debug, vertex_data)
+
+
+def read_vertex_chunks(op, fp, ob, debug, vertex_data=False):
+    """Read the weit and color chunks up to the closing brace of the
+    BVertex or vertexattr chunk. Without vertex_data they are skipped.
+    """
+    for line in fp:
+        words = line.split()
+        if not words:
+            continue
+        key = words[0]
+        if key == b"}":
+            break
+        elif not line.rstrip().endswith(b"{"):
+            continue
+        elif vertex_data and key == b"weit":
+            verts, values = _read_pairs(fp)
+            ob.weit_verts.extend(map(int, verts))
+            ob.weits.extend(map(float, values))
+        elif vertex_data and key == b"color":
+            verts, values = _read_pairs(fp)
+            ob.color_verts.extend(map(int, verts))
+            ob.colors.extend(map(int, values))
+        else:
+            # uid, or weit / color when not imported
+            dprint('skip chunk %s' % key.decode(errors='replace'), debug)
+            skip_block(fp)
+
+
+def _read_pairs(fp):
+    """Return the first and second words of the "index value" lines of a
+    chunk, split in one go.
+    """
+    lines = []
+    for line in fp:
+        if b"}" in line:
+            break
+        lines.append(line)
+    words = b"".join(lines).split()
+    count = len(words) // 2
+    return words[0:2 * count:2], words[1:2 * count:2]
+
+
+def read_faces(op, fp, ob, debug):
+    """Read the face lines of the chunk, return their number, including
+    the ones which are dropped.
+    """
+    count = 0
+    loop_verts = ob.loop_verts
+    loop_start = ob.loop_start
+    loop_total = ob.loop_total
+    edges = ob.edges
+    mat_index = ob.mat_index
+    uvs = ob.uvs
+    uv_mask = ob.uv_mask
+    for line in fp:
+        words = line.split(None, 1)
+        if not words:
+            continue
+        if words[0] == b"}":
+            break
+        count += 1
+        num = int(words[0])
+        start = line.find(b"V(")
+        end = line.find(b")", start)
+        if start == -1 or end == -1:
+            dprint('face without vertex', debug)
+            ob.errors.append("face %i without V() ignored" % (count - 1))
+            continue
+        indices = line[start + 2:end].split()
+        if len(indices) != num:
+            ob.errors.append("face %i with %i vertices declared as %i "
+                             "ignored" % (count - 1, len(indices), num))
+            report(op, 'WARNING', ".mqo import: Face with %i vertices "
+                   "declared as %i ignored" % (len(indices), num))
+            continue
+        if num == 2:
+            edges.extend(map(int, indices))
+        elif num > 2:
+            loop_start.append(len(loop_verts))
+            loop_total.append(num)
+            loop_verts.extend(map(int, indices))
+            # -1 is a face without material
+            start = line.find(b"M(", end)
+            if start == -1:
+                mat_index.append(-1)
+            else:
+                mat_index.append(int(line[start + 2:line.find(b")", start)]))
+            # u v of every corner, in the order of the V() indices
+            start = line.find(b"UV(", end)
+            if start == -1:
+                uv_mask.append(0)
+                continue
+            end = line.find(b")", start)
+            values = line[start + 3:end].split()
+            if len(values) != 2 * num:
+                dprint('face with %i uv values' % len(values), debug)
+                uv_mask.append(0)
+                continue
+            _pad_uvs(uvs, len(loop_verts) - num)
+            uvs.extend(map(float, values))
+            uv_mask.append(1)
+    if uvs:
+        # faces after the last one with UV
+        _pad_uvs(uvs, len(loop_verts))
+    if not uvs or all(uv_mask):
+        del uv_mask[:]
+    return count
+
+
+def _pad_uvs(uvs, num_loops):
+    """Give (0, 0) to the corners of the faces without UV before num_loops."""
+    missing = 2 * num_loops - len(uvs)
+    if missing > 0:
+        uvs.frombytes(bytes(uvs.itemsize * missing))
@@ -0,0 +1,130 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Timings and counters of one import or export.
+
+A Stats object collects the wall time of every phase (read and parse,
+mesh building, linking, view layer update, writing, ...) and what went
+through them (bytes, objects, vertices, faces, loops, triangulated
+ngons). It is reported as a single summary line at the end and can be
+written to a JSON sidecar file.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+from .mqo_parser import report
+
+# counters shown in the summary line, in this order
+SUMMARY_COUNTERS = ("objects", "verts", "faces", "loops", "edges",
+                    "materials", "ngons_triangulated")
+
+
+class Stats:
+    """Phase timings and counters.
+
+    kind     "import" or "export"
+    phases   phase name -> seconds, in the order the phases first ran
+    counters counter name -> value
+    """
+    __slots__ = ("kind", "phases", "counters", "start")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.phases = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, name, iterable):
+        """Yield the items of iterable, the time spent producing them is
+        added to phase name. Used for the records of the streaming parser.
+        """
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield item
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def count_object(self, rec):
+        """Count the geometry of a MQOObject."""
+        self.count("objects")
+        self.count("verts", rec.num_verts)
+        self.count("faces", rec.num_faces)
+        self.count("loops", rec.num_loops)
+        self.count("edges", rec.num_edges)
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {"kind": self.kind,
+                "total_seconds": self.total(),
+                "phases": dict(self.phases),
+                "counters": dict(self.counters)}
+
+    def summary(self):
+        """One line: total and phase times, then the counters."""
+        times = ", ".join("%s %.3f s" % item for item in self.phases.items())
+        line = ".mqo %s: Stats: %.3f s (%s)" % (self.kind, self.total(), times)
+        counts = ["%s %i" % (name, self.counters[name])
+                  for name in SUMMARY_COUNTERS if self.counters.get(name)]
+        for name in ("bytes_read", "bytes_written"):
+            if name in self.counters:
+                counts.insert(0, "%.2f MB %s" % (self.counters[name] / 1e6,
+                                                 name.split("_")[1]))
+        if counts:
+            line += " | " + ", ".join(counts)
+        return line
+
+    def write_json(self, path):
+        with open(path, 'w') as fp:
+            json.dump(self.as_dict(), fp, indent=1)
+
+
+def finish(op, stats, json_path=None):
+    """Report the summary of stats and write it to json_path if set."""
+    report(op, 'INFO', stats.summary())
+    if json_path:
+        try:
+            stats.write_json(json_path)
+        except OSError as e:
+            report(op, 'WARNING', ".mqo %s: Can't write %s: %s"
+                   % (stats.kind, json_path, e))
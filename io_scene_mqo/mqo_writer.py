@@ -0,0 +1,458 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Metasequoia (*.mqo) serializer.
+
+Formats the Object chunks from the flat buffers of a MQOObject. Like the
+parser this module does not use bpy, the exporter only takes a snapshot of
+the Blender mesh and hands it over.
+"""
+
+import codecs
+import hashlib
+import io
+import os
+import pickle
+import sys
+import zipfile
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+from .mqo_math import corner_uvs, face_corners, gather
+
+# number of vertices / edges formatted with a single % operation
+CHUNK = 4096
+WRITE_BUFFER = 1 << 20
+
+_VERTEX_FMT = "\t\t%.5f %.5f %.5f\n"
+_EDGE_FMT = "\t\t2 V(%i %i)\n"
+_UV_FMT = "%.5f"
+
+DOCUMENT_HEADER = "Metasequoia Document\nFormat Text Ver %.1f\n"
+# text of a document in this encoding is marked as such, Metasequoia reads
+# Shift-JIS otherwise
+UTF8_CODEPAGE = "CodePage utf8\n"
+SCENE_HEADER = ("\nScene {\n"
+                "    pos 0.0000 0.0000 1500.0000\n"
+                "    lookat 0.0000 0.0000 0.0000\n    head -0.5236\n"
+                "    pich 0.5236\n    bank 0.0000\n    ortho 0\n"
+                "    zoom2 5.0000\n    amb 0.250 0.250 0.250\n"
+                "    dirlights 1 {\n        light {\n"
+                "            dir 0.408 0.408 0.816\n"
+                "            color 1.000 1.000 1.000\n        }\n    }\n}\n")
+
+DEFAULT_MATERIAL = ("Material 1 {\n\t\"mat1\" shader(3) "
+                    "col(1.000 1.000 1.000 1.000) dif(0.800) amb(0.600) "
+                    "emi(0.000) spc(0.000) power(5.00)\n}\n")
+
+# attributes of an Object chunk and the values written when the record
+# doesn't have them
+OBJECT_DEFAULTS = (("depth", "0"), ("folding", "0"), ("scale", "1 1 1"),
+                   ("rotation", "0 0 0"), ("translation", "0 0 0"),
+                   ("visible", "15"), ("locking", "0"), ("shading", "1"),
+                   ("facet", "59.5"), ("color", "0.898 0.498 0.698"),
+                   ("color_type", "0"))
+OBJECT_HEADER = "Object \"%s\" {\n" + "".join(
+    "\t%s %s\n" % item for item in OBJECT_DEFAULTS)
+
+
+def write_file(filepath, version, materials, records, invert, uv_exp, uv_cor,
+               binary=False, workers=1, mqoz=False, compress_level=6,
+               textures=(), cache=None, encoding="utf-8"):
+    """Write a whole document to filepath, as .mqo or zipped .mqoz.
+
+    records are (MQOObject, mat_offset) pairs and may be a generator, each
+    object is written as soon as it is formatted. textures are
+    (arcname, path or bytes) pairs stored next to the .mqo in a .mqoz.
+    encoding is the one of the text, see document_encoding.
+    """
+    args = (version, materials, records, invert, uv_exp, uv_cor, binary,
+            workers, cache)
+    if mqoz:
+        # the document is compressed while it is written, it never exists
+        # uncompressed on disk or in memory
+        name = os.path.splitext(os.path.basename(filepath))[0] + ".mqo"
+        with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED,
+                             compresslevel=compress_level) as zfile:
+            with zfile.open(name, 'w', force_zip64=True) as member:
+                with io.TextIOWrapper(member, encoding) as fp:
+                    write_document(fp, *args)
+            for arcname, data in textures:
+                if isinstance(data, bytes):
+                    zfile.writestr(arcname, data)
+                else:
+                    zfile.write(data, arcname)
+    else:
+        # the file buffer bounds the memory instead of keeping the whole
+        # document in a list
+        with open(filepath, 'w', buffering=WRITE_BUFFER,
+                  encoding=encoding) as fp:
+            write_document(fp, *args)
+    return filepath
+
+
+def write_files(jobs, workers=None):
+    """Call write_file for every argument tuple of jobs, concurrently.
+
+    Returns (written, failed): the written paths in job order and the
+    (path, OSError) of the files which couldn't be written. Only a few jobs
+    are in flight at a time so the snapshots of the next files are taken
+    meanwhile.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    jobs = iter(jobs)
+    written = []
+    failed = []
+    pending = deque()
+
+    def collect(args, func, *func_args):
+        # a file's own error is reported for it, the other files go on
+        try:
+            written.append(func(*func_args))
+        except OSError as e:
+            failed.append((args[0], e))
+
+    if workers > 1:
+        try:
+            with _start_pool(workers) as executor:
+                for args in jobs:
+                    # queued before the submit, if that fails the file is
+                    # written here with the rest of pending
+                    pending.append((args, None))
+                    pending[-1] = (args, _submit(executor, write_file, *args))
+                    if len(pending) > 2 * workers:
+                        collect(pending[0][0], _result, pending[0][1])
+                        pending.popleft()
+                while pending:
+                    collect(pending[0][0], _result, pending[0][1])
+                    pending.popleft()
+        except PoolError as e:
+            print(".mqo export: Parallel writing failed (%s). "
+                  "Writing in this process" % e)
+    for args, future in pending:
+        collect(args, write_file, *args)
+    for args in jobs:
+        collect(args, write_file, *args)
+    return written, failed
+
+
+def write_document(fp, version, materials, records, invert, uv_exp, uv_cor,
+                   binary=False, workers=1, cache=None):
+    """Write header, Material chunk, objects and Eof to the text stream fp.
+
+    materials is a list of material lines, None writes a default material.
+    """
+    fw = fp.write
+    bw = None
+    if binary:
+        def bw(data):
+            # text written so far must reach the file before the payload
+            fp.flush()
+            fp.buffer.write(data)
+    write_header(fw, version, getattr(fp, "encoding", None))
+    write_materials(fw, materials)
+    write_objects(fw, bw, records, invert, uv_exp, uv_cor, workers, cache)
+    fw("Eof\n")
+
+
+def document_encoding(texts, shift_jis=False):
+    """Return the encoding to write a document holding texts (names and
+    material lines) with: ascii when they all are, shift_jis when the
+    source was read as Shift-JIS and they fit, utf-8 otherwise.
+    """
+    texts = list(texts)
+    if all(text.isascii() for text in texts):
+        return "ascii"
+    if shift_jis:
+        try:
+            for text in texts:
+                text.encode("shift_jis")
+            return "shift_jis"
+        except UnicodeEncodeError:
+            pass
+    return "utf-8"
+
+
+def write_header(fw, version, encoding=None):
+    fw(DOCUMENT_HEADER % version)
+    if encoding is not None and codecs.lookup(encoding).name == "utf-8":
+        fw(UTF8_CODEPAGE)
+    fw(SCENE_HEADER)
+
+
+def write_materials(fw, materials):
+    if materials is None:
+        fw(DEFAULT_MATERIAL)
+        return
+    fw("Material %d {\n" % (len(materials)))
+    for mat in materials:
+        fw("%s" % (mat))
+    fw("}\n")
+
+
+def format_material(mat):
+    """Return the Material chunk line of a MQOMaterial."""
+    line = ("\t\"%s\" col(%.3f %.3f %.3f %.3f) dif(%.3f) amb(%.3f) emi(%.3f) "
+            "spc(%.3f) power(%.2f)" % ((mat.name,) + tuple(mat.color) + (
+                mat.dif, mat.amb, mat.emi, mat.spc, mat.power)))
+    for key in ("tex", "aplane", "bump"):
+        if getattr(mat, key):
+            line += ' %s("%s")' % (key, getattr(mat, key))
+    return line + "\n"
+
+
+def write_object(fw, ob, invert, uv_exp, uv_cor, mat_offset=0, bw=None):
+    """Write the Object chunk of ob with the callable fw.
+
+    When bw is given the vertices are written as a BVertex chunk, fw must
+    accept text and bw the binary payload of the same stream.
+    """
+    given = set(line.split(None, 1)[0] for attr in ob.attrs
+                for line in attr.splitlines() if line.strip())
+    if given.isdisjoint(key for key, value in OBJECT_DEFAULTS):
+        fw(OBJECT_HEADER % ob.name)
+    else:
+        # a parsed object keeps its own depth, visible, ...
+        fw("Object \"%s\" {\n" % ob.name)
+        fw("".join("\t%s %s\n" % (key, value) for key, value in OBJECT_DEFAULTS
+                   if key not in given))
+    for attr in ob.attrs:
+        fw(attr)
+    if bw is None:
+        write_vertices(fw, ob.coords)
+    else:
+        write_bvertices(fw, bw, ob.coords)
+    write_faces(fw, ob, invert, uv_exp, uv_cor, mat_offset)
+    fw("}\n")
+
+
+def format_object(ob, invert, uv_exp, uv_cor, mat_offset=0, binary=False):
+    """Return the Object chunk of ob as a list of str (and bytes) parts.
+
+    Runs in the worker processes of write_objects.
+    """
+    parts = []
+    append = parts.append
+    write_object(append, ob, invert, uv_exp, uv_cor, mat_offset,
+                 append if binary else None)
+    return parts
+
+
+def write_objects(fw, bw, records, invert, uv_exp, uv_cor, workers=1,
+                  cache=None):
+    """Write the (MQOObject, mat_offset) pairs of records in order.
+
+    With more than one worker the objects are formatted by a process pool.
+    Only a few objects are in flight at a time so the memory stays bounded
+    while the next snapshots are taken. If the pool breaks, the remaining
+    objects are formatted in this process.
+
+    cache is an optional dict of object name -> (fingerprint, parts). An
+    object whose fingerprint did not change is not formatted again, the
+    cached parts are written instead.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    binary = bw is not None
+    records = iter(records)
+    pending = deque()
+
+    def lookup(ob, mat_offset):
+        if cache is None:
+            return None, None
+        key = fingerprint(ob, mat_offset, invert, uv_exp, uv_cor, binary)
+        hit = cache.get(ob.name)
+        return key, (hit[1] if hit is not None and hit[0] == key else None)
+
+    def finish(ob, key, parts):
+        if cache is not None:
+            cache[ob.name] = (key, parts)
+        _write_parts(fw, bw, parts)
+
+    def write_here(ob, mat_offset):
+        key, parts = lookup(ob, mat_offset)
+        if parts is None:
+            if cache is None:
+                write_object(fw, ob, invert, uv_exp, uv_cor, mat_offset, bw)
+                return
+            parts = format_object(ob, invert, uv_exp, uv_cor, mat_offset,
+                                  binary)
+        finish(ob, key, parts)
+
+    if workers > 1:
+        # only a failure of the pool itself falls back, an error writing
+        # the document goes up to the caller
+        try:
+            with _start_pool(workers) as executor:
+                for ob, mat_offset in records:
+                    key, result = lookup(ob, mat_offset)
+                    # queued before the submit, if that fails the object
+                    # is formatted here with the rest of pending
+                    pending.append((ob, mat_offset, key, result))
+                    if result is None:
+                        pending[-1] = (ob, mat_offset, key, _submit(
+                            executor, format_object, ob, invert, uv_exp,
+                            uv_cor, mat_offset, binary))
+                    if len(pending) > 2 * workers:
+                        _finish_pending(pending, finish)
+                while pending:
+                    _finish_pending(pending, finish)
+        except PoolError as e:
+            print(".mqo export: Parallel serialization failed (%s). "
+                  "Serializing in this process" % e)
+    for ob, mat_offset, key, result in pending:
+        write_here(ob, mat_offset)
+    for ob, mat_offset in records:
+        write_here(ob, mat_offset)
+
+
+def _finish_pending(pending, finish):
+    ob, mat_offset, key, result = pending[0]
+    parts = result if isinstance(result, list) else _result(result)
+    finish(ob, key, parts)
+    pending.popleft()
+
+
+class PoolError(Exception):
+    """The process pool can't be used, the remaining work is done in this
+    process.
+    """
+
+
+# raised by the pool itself rather than by the work it runs
+_POOL_ERRORS = (BrokenProcessPool, pickle.PicklingError)
+
+
+def _start_pool(workers):
+    try:
+        return ProcessPoolExecutor(workers)
+    except (OSError, NotImplementedError) as e:
+        raise PoolError(e) from e
+
+
+def _submit(executor, func, *args):
+    # worker processes are started by submit, which fails with OSError
+    # when they can't be
+    try:
+        return executor.submit(func, *args)
+    except (OSError,) + _POOL_ERRORS as e:
+        raise PoolError(e) from e
+
+
+def _result(future):
+    """future.result(), the exceptions of the work itself go through."""
+    try:
+        return future.result()
+    except _POOL_ERRORS as e:
+        raise PoolError(e) from e
+
+
+def fingerprint(ob, mat_offset, invert, uv_exp, uv_cor, binary):
+    """Digest of everything that ends up in the Object chunk of ob."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((mat_offset, invert, uv_exp, uv_cor, binary)).encode())
+    for slot in type(ob).__slots__:
+        value = getattr(ob, slot)
+        if isinstance(value, array):
+            h.update(("%s %s %i|" % (slot, value.typecode, len(value))).encode())
+            h.update(value)
+        else:
+            h.update(("%s %r|" % (slot, value)).encode())
+    return h.digest()
+
+
+def _write_parts(fw, bw, parts):
+    for part in parts:
+        if isinstance(part, bytes):
+            bw(part)
+        else:
+            fw(part)
+
+
+def write_vertices(fw, coords):
+    count = len(coords) // 3
+    fw("\tvertex %i {\n" % count)
+    _write_repeated(fw, _VERTEX_FMT, coords, 3)
+    fw("\t}\n")
+
+
+def write_bvertices(fw, bw, coords):
+    count = len(coords) // 3
+    fw("\tBVertex %i {\n\t\tVector %i [%i]\n" % (count, count, 12 * count))
+    if sys.byteorder != "little":
+        coords = coords[:]
+        coords.byteswap()
+    # little-endian float32 x y z, written in one piece
+    bw(coords.tobytes())
+    fw("\n\t}\n")
+
+
+def write_faces(fw, ob, invert, uv_exp, uv_cor, mat_offset=0):
+    fw("\tface %i {\n" % (ob.num_edges + ob.num_faces))
+    _write_repeated(fw, _EDGE_FMT, ob.edges, 2)
+
+    # winding and V flip are applied to the whole loop arrays, the faces
+    # are then consecutive slices of them
+    corners = face_corners(ob.loop_start, ob.loop_total, invert)
+    verts = gather(ob.loop_verts, corners)
+    uvs = None
+    if uv_exp and ob.uvs:
+        uvs = corner_uvs(ob.uvs, corners, uv_cor)
+    mats = ob.mat_index or repeat(0)
+    # faces read without UV() are written without it
+    has_uv = ob.uv_mask or repeat(1)
+    lines = []
+    append = lines.append
+    pos = 0
+    for total, mat, face_uv in zip(ob.loop_total, mats, has_uv):
+        end = pos + total
+        if mat >= 0:
+            line = "\t\t%d V(%s) M(%d)" % (
+                total, " ".join(map(str, verts[pos:end])), mat + mat_offset)
+        else:
+            # a face read without M() keeps having no material
+            line = "\t\t%d V(%s)" % (total, " ".join(map(str, verts[pos:end])))
+        if uvs and face_uv:
+            line = "%s UV(%s)" % (
+                line, " ".join(map(_UV_FMT.__mod__, uvs[2 * pos:2 * end])))
+        append(line)
+        pos = end
+        if len(lines) == CHUNK:
+            lines.append("")
+            fw("\n".join(lines))
+            lines.clear()
+    if lines:
+        lines.append("")
+        fw("\n".join(lines))
+    fw("\t}\n")
+
+
+def _write_repeated(fw, fmt, values, width):
+    count = len(values) // width
+    block = fmt * CHUNK
+    for first in range(0, count, CHUNK):
+        n = min(CHUNK, count - first)
+        fmt_n = block if n == CHUNK else fmt * n
+        fw(fmt_n % tuple(values[first * width:(first + n) * width]))
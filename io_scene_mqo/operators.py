@@ -0,0 +1,391 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8-80 compliant>
+
+"""
+Blender operators and menu entries of the add-on.
+
+Kept out of __init__ so the parser and writer modules can be imported
+without bpy, e.g. by the worker processes of the parallel importer.
+"""
+
+import os
+import bpy
+from bpy.props import (CollectionProperty,
+                       StringProperty,
+                       EnumProperty,
+                       )
+from bpy_extras.io_utils import (ExportHelper,
+                                 ImportHelper,
+                                 )
+
+
+class ExportMQO(bpy.types.Operator, ExportHelper):
+    """Export to a Metasequoia file (.mqo)"""
+    bl_idname = "io_export_scene.mqo"
+    bl_description = 'Export to mqo file format (.mqo)'
+    bl_label = "Export mqo"
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+ 
+    # From ExportHelper. Filter filenames.
+    filename_ext = ".mqo"
+    filter_glob : StringProperty(default="*.mqo;*.mqoz", options={'HIDDEN'})
+
+    scale : bpy.props.FloatProperty(
+        name = "Scale", 
+        description="Scale mesh. Value > 1 means bigger, value < 1 means smaller", 
+        default = 1, min = 0.001, max = 1000.0, step=1, precision=3, soft_min=.001, soft_max=1000.0)
+ 
+    rot90 : bpy.props.BoolProperty(
+        name = "Up axis correction",
+        description="Blender up axis is Z but Metasequoia up axis is Y\nExporter will invert value to be in the correct direction",
+        default = True)
+    
+    invert : bpy.props.BoolProperty(
+        name = "Correction of inverted faces",
+        description="Correction of inverted faces",
+        default = True)
+
+    no_ngons : bpy.props.BoolProperty(
+        name = "Convert ngons to triangles",
+        description = "ngons not supported in older versions of Metasequoia",
+        default = False)
+    
+    edge : bpy.props.BoolProperty(
+        name = "Export lost edge",
+        description="Export edge which is not attached to a polygon",
+        default = True)
+ 
+    uv_exp : bpy.props.BoolProperty(
+        name = "Export UV",
+        description="Export UV",
+        default = True)
+    
+    uv_cor : bpy.props.BoolProperty(
+        name = "Convert UV",
+        description="Invert UV map to be in the same direction as Metasequoia",
+        default = True)
+        
+    mat_exp : bpy.props.BoolProperty(
+        name = "Export Materials",
+        description="...",
+        default = True)
+    
+    mod_exp : bpy.props.BoolProperty(
+        name = "Export Modifier",
+        description="Export modifier like mirror or/and subdivision surface",
+        default = True)
+
+    bvertex : bpy.props.BoolProperty(
+        name = "Binary vertices",
+        description="Write vertices as a binary BVertex chunk.\nSmaller file and full float precision",
+        default = False)
+
+    mqoz : bpy.props.BoolProperty(
+        name = "Compressed (.mqoz)",
+        description="Write a zip compressed .mqoz file",
+        default = False)
+
+    compress_level : bpy.props.IntProperty(
+        name = "Compression level",
+        description="Deflate level of the .mqoz file. 1 is fastest, 9 is smallest",
+        default = 6, min = 0, max = 9)
+
+    pack_textures : bpy.props.BoolProperty(
+        name = "Bundle textures",
+        description="Store the textures used by the exported materials in the .mqoz file",
+        default = False)
+
+    workers : bpy.props.IntProperty(
+        name = "Serializer processes",
+        description="Number of processes formatting objects in parallel.\n1 formats in Blender only, 0 uses all cores on large scenes.\nThe processes are started by forking Blender on Linux",
+        default = 1, min = 0, max = 256)
+
+    incremental : bpy.props.BoolProperty(
+        name = "Reuse unchanged objects",
+        description="Remember the text of every exported object and only serialize objects which changed since the last export.\nKeeps the exported text in memory",
+        default = False)
+
+    split_mode : EnumProperty(
+        name = "Split",
+        description="Write everything into one file or one file per object / collection, named after it",
+        items = (('NONE', "Single file", "Export all objects into the selected file"),
+                 ('OBJECT', "One file per object", "Export each object into its own file in the selected folder"),
+                 ('COLLECTION', "One file per collection", "Export each collection into its own file in the selected folder"),
+                 ),
+        default = 'NONE')
+
+    write_stats : bpy.props.BoolProperty(
+        name = "Write statistics",
+        description="Write the time of every export phase and the exported counts to a JSON file next to the exported file (.stats.json)",
+        default = False)
+
+    def check(self, context):
+        self.filename_ext = ".mqoz" if self.mqoz else ".mqo"
+        return ExportHelper.check(self, context)
+    
+    def execute(self, context):
+        msg = ".mqo export: Executing"
+        self.report({'INFO'}, msg)
+        print(msg)
+        if self.scale < 1:
+            s = "%.0f times smaller" % (1.0/self.scale)
+        elif self.scale > 1:
+            s = "%.0f times bigger" % self.scale
+        else:
+            s = "same size"            
+        msg = ".mqo export: Objects will be %s"%(s)
+        print(msg)
+        self.report({'INFO'}, msg)
+        from . import export_mqo
+        meshobjects = [ob for ob in context.scene.objects if ob.type == 'MESH']
+        stats_path = self.properties.filepath + ".stats.json" if self.write_stats else None
+        export_mqo.export_mqo(self,
+            self.properties.filepath, 
+            meshobjects, 
+            self.rot90, self.invert, self.no_ngons, self.edge, self.uv_exp, self.uv_cor, self.mat_exp, self.mod_exp,
+            self.scale, self.bvertex,
+            self.mqoz, self.compress_level, self.pack_textures,
+            self.workers, self.split_mode, self.incremental, stats_path)
+        return {'FINISHED'}
+ 
+    def invoke(self, context, event):
+        meshobjects = [ob for ob in context.scene.objects if ob.type == 'MESH']
+        if not meshobjects:
+            msg = ".mqo export: Cancelled - No MESH objects to export."
+            self.report({'ERROR'}, msg)
+            print(msg,"\n")
+            return{'CANCELLED'}
+        pth, fn = os.path.split(bpy.data.filepath)
+        nm, xtn = os.path.splitext(fn)
+        if nm =="":
+            nm = meshobjects[0].name
+        self.properties.filepath = nm
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+class ImportMQO(bpy.types.Operator, ImportHelper):
+    """Import a Metasequoia file (.mqo)"""
+    bl_idname = "io_import_scene.mqo"
+    bl_description = 'Import from mqo file format (.mqo)'
+    bl_label = "Import mqo"
+    bl_space_type = "PROPERTIES"
+    bl_region_type = "WINDOW"
+    bl_options = {'REGISTER', 'UNDO'}
+ 
+    # From ImportHelper. Filter filenames.
+    filter_glob : StringProperty(default="*.mqo;*.mqoz", options={'HIDDEN'})
+
+    scale : bpy.props.FloatProperty(
+        name = "Scale", 
+        description="Scale mesh. Value > 1 means bigger, value < 1 means smaller", 
+        default = 1, min = 0.001, max = 1000.0, step=1, precision=3, soft_min=0.001, soft_max=1000.0)
+ 
+    rot90 : bpy.props.BoolProperty(
+        name = "Up axis correction",
+        description="Blender up axis is Z but Metasequoia up axis is Y\nExporter will invert value to be in the correct direction",
+        default = True)
+
+    uv_cor : bpy.props.BoolProperty(
+        name = "Convert UV",
+        description="Invert UV map to be in the same direction as Blender",
+        default = True)
+
+    vertex_data : bpy.props.BoolProperty(
+        name = "Import weights and colors",
+        description="Import the weit chunk as a vertex group and the color chunk as a color attribute.\nThey are skipped otherwise",
+        default = False)
+
+    debug : bpy.props.BoolProperty(
+        name = "Show debug text",
+        description="Print debug text to console",
+        default = False)
+
+    workers : bpy.props.IntProperty(
+        name = "Parser processes",
+        description="Number of processes parsing objects or files in parallel.\n1 parses in Blender only, 0 uses all cores.\nThe processes are started by forking Blender on Linux",
+        default = 1, min = 0, max = 256)
+
+    use_cache : bpy.props.BoolProperty(
+        name = "Use parse cache",
+        description="Keep parsed geometry on disk, keyed by file content and import options.\nImporting an unchanged file again skips parsing.\nThe add-on preferences show its size and can clear it",
+        default = False)
+
+    cache_size : bpy.props.IntProperty(
+        name = "Cache size (MB)",
+        description="Least recently used cache entries are removed above this size",
+        default = 1024, min = 1)
+
+    files : CollectionProperty(type=bpy.types.OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+
+    directory : StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    import_folder : bpy.props.BoolProperty(
+        name = "Import whole folder",
+        description="Import every .mqo and .mqoz file of the folder",
+        default = False)
+
+    write_stats : bpy.props.BoolProperty(
+        name = "Write statistics",
+        description="Write the time of every import phase and the imported counts to a JSON file next to the imported file (.stats.json)",
+        default = False)
+
+    def batch_paths(self):
+        import pathlib # Python 3.4
+        directory = pathlib.Path(self.directory or os.path.dirname(self.properties.filepath))
+        if self.import_folder:
+            return sorted(p for p in directory.iterdir()
+                          if p.is_file() and p.suffix.lower() in [".mqo", ".mqoz"])
+        names = [f.name for f in self.files if f.name]
+        if len(names) > 1:
+            return [directory / name for name in names]
+        return []
+
+    def execute(self, context):
+        import pathlib # Python 3.4
+        from . import mqo_cache
+        cache_dir = mqo_cache.default_cache_dir() if self.use_cache else None
+        cache_size = self.cache_size * 1024 * 1024
+        paths = self.batch_paths()
+        if paths:
+            msg = ".mqo import: Opening %i files" % len(paths)
+            print(msg)
+            self.report({'INFO'}, msg)
+            from . import import_mqo
+            stats_path = str(paths[0].parent / "mqo_import.stats.json") if self.write_stats else None
+            import_mqo.open_mqo_files(self,
+                paths,
+                self.rot90,
+                self.scale,
+                self.debug,
+                self.workers,
+                cache_dir,
+                cache_size,
+                self.uv_cor,
+                self.vertex_data,
+                stats_path)
+            return {'FINISHED'}
+
+        pth  = pathlib.Path(self.properties.filepath)
+
+        if pth.suffix == "":
+            pth  = pathlib.Path(self.properties.filepath + ".mqo")
+            file_exists = pth.exists()
+            if not file_exists:
+                pth = pathlib.Path(self.properties.filepath + ".mqoz")
+                file_exists = pth.exists()
+                if not file_exists:
+                    pth = pathlib.Path(self.properties.filepath)
+        else:
+            file_exists = pth.exists() 
+
+        if not file_exists:
+            msg = "File not found: %s" % pth 
+            print(msg)
+            self.report({'ERROR'}, msg)
+            return{'CANCELLED'}  
+        
+        if pth.suffix.lower() not in [".mqo", ".mqoz"]:
+            msg = "Not a Metasequoia file: %s" % pth
+            print(msg)
+            self.report({'ERROR'}, msg)
+            return{'CANCELLED'}
+
+        msg = ".mqo import: Opening %s"% pth
+        print(msg)
+        self.report({'INFO'}, msg)
+        if self.scale < 1:
+            s = "%.0f times smaller" % (1.0/self.scale)
+        elif self.scale > 1:
+            s = "%.0f times bigger" % self.scale
+        else:
+            s = "same size"            
+        msg = ".mqo import: Objects will be %s"%(s)
+        print(msg)
+        self.report({'INFO'}, msg)        
+        from . import import_mqo
+        import_mqo.open_mqo(self,
+            pth, 
+            self.rot90,
+            self.scale,
+            self.debug,
+            self.workers,
+            cache_dir,
+            cache_size,
+            self.uv_cor,
+            self.vertex_data,
+            str(pth) + ".stats.json" if self.write_stats else None)
+        return {'FINISHED'}
+
+
+class ClearMQOCache(bpy.types.Operator):
+    """Remove every entry of the .mqo import parse cache"""
+    bl_idname = "io_import_scene.mqo_clear_cache"
+    bl_label = "Clear mqo parse cache"
+
+    def execute(self, context):
+        from . import mqo_cache
+        info = mqo_cache.cache_info()
+        count = mqo_cache.clear_cache(info["directory"])
+        msg = ".mqo import: Removed %i cache entries (%.1f MB) from %s" % (
+            count, info["bytes"] / (1024 * 1024), info["directory"])
+        print(msg)
+        self.report({'INFO'}, msg)
+        return {'FINISHED'}
+
+
+class MQOPreferences(bpy.types.AddonPreferences):
+    """Shows where the parse cache is and how big it is"""
+    bl_idname = __package__
+
+    def draw(self, context):
+        from . import mqo_cache
+        info = mqo_cache.cache_info()
+        layout = self.layout
+        layout.label(text="Parse cache: %s" % info["directory"])
+        row = layout.row()
+        row.label(text="%i entries, %.1f MB" % (info["entries"], info["bytes"] / (1024 * 1024)))
+        row.operator(ClearMQOCache.bl_idname, text="Clear cache", icon='TRASH')
+
+def menu_func_import(self, context):
+    self.layout.operator(ImportMQO.bl_idname, text="50Thom Metasequoia (.mqo)")
+
+
+def menu_func_export(self, context):
+    self.layout.operator(ExportMQO.bl_idname, text="50Thom Metasequoia (.mqo)")
+
+
+def register():
+    bpy.utils.register_class(ImportMQO)
+    bpy.utils.register_class(ExportMQO)
+    bpy.utils.register_class(ClearMQOCache)
+    bpy.utils.register_class(MQOPreferences)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+
+
+def unregister():
+    bpy.utils.unregister_class(ImportMQO)
+    bpy.utils.unregister_class(ExportMQO)
+    bpy.utils.unregister_class(ClearMQOCache)
+    bpy.utils.unregister_class(MQOPreferences)
+
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
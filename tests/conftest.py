@@ -0,0 +1,6 @@
+# the add-on package is imported from the repository folder, without bpy
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Documents and helpers shared by the tests."""
+
+import io
+
+from io_scene_mqo import mqo_parser
+
+# a BVertex payload whose bytes look like braces and a Vector header
+TRAP = b"{{}}}Vector 1 [99]\n}}{" + bytes(4)
+
+SKIPPED = (b"Scene {\r\n\tpos 0 0 1500\r\n\tdirlights 1 {\r\n\t\tlight {\r\n"
+           b"\t\t\tdir 0.4 0.4 0.8\r\n\t\t}\r\n\t}\r\n}\r\n"
+           b"Unknown {\r\n\tBVertex 2 {\r\n\t\tVector 2 [24]\r\n" + TRAP
+           + b"\r\n\t}\r\n\tnested { { } }\r\n}\r\n")
+
+OBJECT = (b'Object "quad" {\r\n\tdepth 1\r\n\tvisible 0\r\n\tmirror 1\r\n'
+          b"\tvertex 4 {\r\n\t\t0 0 0\r\n\t\t1 0 0\r\n\t\t1 1 0\r\n"
+          b"\t\t0 1 0\r\n\t}\r\n"
+          b"\tvertexattr {\r\n\t\tuid {\r\n\t\t\t1\r\n\t\t}\r\n\t}\r\n"
+          b"\tface 3 {\r\n\t\t2 V(0 2)\r\n"
+          b"\t\t3 V(0 1 2) M(0) UV(0 0 1 0 1 1)\r\n"
+          b"\t\t3 V(0 2 3) M(1)\r\n\t}\r\n}\r\n")
+
+MATERIALS = (b"Material 2 {\r\n"
+             b'\t"red" shader(3) vcol(1) dbls(1) col(1.000 0.000 0.000 1.000)'
+             b' dif(0.800) amb(0.600) emi(0.000) spc(0.000) power(5.00)\r\n'
+             b'\t"tex" col(1 1 1 1) tex("tex/sub.png") aplane("../up.png")\r\n'
+             b"}\r\n")
+
+DOCUMENT = (b"Metasequoia Document\r\nFormat Text Ver 1.0\r\n\r\n" + SKIPPED
+            + MATERIALS + OBJECT + b"Eof\r\n")
+
+
+def parse_bytes(data, buffer_size=mqo_parser.READ_BUFFER):
+    materials = []
+    fp = io.BufferedReader(io.BytesIO(data), buffer_size)
+    objects = list(mqo_parser.iter_objects(None, fp, False, 1.0,
+                                           materials=materials))
+    return materials, objects
+
+
+def write_document(path, data):
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    return str(path)
+
+
+def check_quad(ob):
+    assert ob.name == "quad"
+    assert ob.num_verts == 4
+    assert list(ob.edges) == [0, 2]
+    assert list(ob.loop_verts) == [0, 1, 2, 0, 2, 3]
+    assert list(ob.mat_index) == [0, 1]
+    assert list(ob.uv_mask) == [1, 0]
+    assert not ob.errors
@@ -0,0 +1,80 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the BVertex chunk."""
+
+import struct
+from array import array
+
+import pytest
+
+from io_scene_mqo import mqo_parser, mqo_writer
+from tests.samples import parse_bytes
+
+
+def bin_object():
+    ob = mqo_parser.MQOObject("bin")
+    # 1/3 isn't exact in text with 5 decimals but is in float32
+    ob.coords = array('f', [1 / 3, -2.5, 1e-7, 123456.789, 0.0, -0.0])
+    ob.loop_verts = array('i', [0, 1, 0])
+    return ob
+
+
+def test_write_bvertex(tmp_path):
+    ob = bin_object()
+    path = str(tmp_path / "bin.mqo")
+    mqo_writer.write_file(path, 1.0, None, [(ob, 0)], False, True, False,
+                          binary=True)
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    assert b"\tvertex" not in data
+    header = b"\tBVertex 2 {\n\t\tVector 2 [24]\n"
+    start = data.index(header) + len(header)
+    assert struct.unpack("<6f", data[start:start + 24]) == tuple(ob.coords)
+    assert data[start + 24:].startswith(b"\n\t}\n")
+
+
+def test_bvertex_round_trip(tmp_path):
+    ob = bin_object()
+    path = str(tmp_path / "bin.mqo")
+    mqo_writer.write_file(path, 1.0, None, [(ob, 0)], False, True, False,
+                          binary=True)
+    materials, objects = mqo_parser.parse_file(path, rot90=False)
+    assert objects[0].coords == ob.coords
+    assert not objects[0].errors
+
+
+def test_bvertex_byte_count_mismatch():
+    # 2 vertices declared with the bytes of 1 and a half
+    data = (b"Metasequoia Document\r\nFormat Text Ver 1.0\r\n"
+            b'Object "o" {\r\n\tBVertex 2 {\r\n\t\tVector 2 [18]\r\n'
+            + struct.pack("<5f", 1, 2, 3, 4, 5)[:18]
+            + b"\r\n\t}\r\n}\r\nEof\r\n")
+    materials, objects = parse_bytes(data)
+    assert objects[0].coords == array('f', [1, 2, 3])
+    assert objects[0].errors[0] == "BVertex declares 2 vertices but 18 bytes"
+
+
+def test_bvertex_truncated_payload():
+    data = (b"Metasequoia Document\r\n"
+            b'Object "o" {\r\n\tBVertex 2 {\r\n\t\tVector 2 [24]\r\n'
+            + bytes(10))
+    with pytest.raises(EOFError):
+        parse_bytes(data)
@@ -0,0 +1,71 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the parse cache."""
+
+import os
+
+from io_scene_mqo import mqo_cache
+from tests.samples import DOCUMENT, check_quad, write_document
+
+
+def test_cache_store_and_load(tmp_path):
+    path = write_document(tmp_path / "doc.mqo", DOCUMENT)
+    cache_dir = str(tmp_path / "cache")
+    key = mqo_cache.file_key(path, False, 1.0)
+    assert mqo_cache.load(cache_dir, key) is None
+    materials, objects = mqo_cache.parse_file(path, False, 1.0, cache_dir)
+    assert mqo_cache.cache_info(cache_dir)["entries"] == 1
+    cached = mqo_cache.load(cache_dir, key)
+    assert cached is not None
+    for items, cached_items in zip((materials, objects), cached):
+        for item, cached_item in zip(items, cached_items):
+            for slot in type(item).__slots__:
+                assert getattr(cached_item, slot) == getattr(item, slot)
+    assert mqo_cache.clear_cache(cache_dir) == 1
+
+
+def test_cache_damaged_entry(tmp_path):
+    cache_dir = str(tmp_path)
+    assert mqo_cache.store(cache_dir, "key", [], []) is None
+    entry = os.path.join(cache_dir, "key" + mqo_cache.EXTENSION)
+    with open(entry, 'r+b') as fp:
+        fp.truncate(6)
+    assert mqo_cache.load(cache_dir, "key") is None
+    assert mqo_cache.cache_info(cache_dir)["entries"] == 0
+
+
+def test_cache_unwritable_directory(tmp_path, capsys):
+    path = write_document(tmp_path / "doc.mqo", DOCUMENT)
+    # a folder can't be created under a file
+    cache_dir = os.path.join(path, "cache")
+    assert "Can't write" in mqo_cache.store(cache_dir, "key", [], [])
+    materials, objects = mqo_cache.parse_file(path, False, 1.0, cache_dir)
+    check_quad(objects[0])
+    assert "Can't write the parse cache" in capsys.readouterr().out
+
+
+def test_cache_key_follows_content(tmp_path):
+    path = write_document(tmp_path / "doc.mqo", DOCUMENT)
+    key = mqo_cache.file_key(path, False, 1.0)
+    assert mqo_cache.file_key(path, True, 1.0) != key
+    assert mqo_cache.file_key(path, False, 2.0) != key
+    write_document(path, DOCUMENT.replace(b"1 1 0", b"2 2 0"))
+    assert mqo_cache.file_key(path, False, 1.0) != key
@@ -0,0 +1,105 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the stat, validate and convert commands."""
+
+import zipfile
+
+import pytest
+
+from benchmarks import generate
+from io_scene_mqo import mqo_cli, mqo_parser
+from tests.samples import DOCUMENT, write_document
+
+
+MALFORMED = (b"Metasequoia Document\r\nFormat Text Ver 1.0\r\n"
+             b'Object "bad" {\r\n\tvertex 9 {\r\n\t\t0 0 0\r\n\t\t1 0 0\r\n'
+             b"\t\t0 1 0\r\n\t}\r\n\tface 7 {\r\n\t\t3 V(0 1 2)\r\n"
+             b"\t\t4 V(0 1 2)\r\n\t\t3 V(0 1 5)\r\n\t}\r\n}\r\nEof\r\n")
+
+
+def test_validate_malformed(tmp_path, capsys):
+    path = write_document(tmp_path / "bad.mqo", MALFORMED)
+    errors, warnings = mqo_cli.validate_file(path)
+    text = "\n".join(errors)
+    assert "vertex chunk declares 9 elements but has 3" in text
+    assert "face chunk declares 7 elements but has 3" in text
+    assert "with 3 vertices declared as 4" in text
+    assert "vertex indices out of range" in text
+    assert mqo_cli.main(["validate", "-q", path]) == 1
+
+
+@pytest.mark.parametrize("data", [
+    b"Metasequoia Document\r\nObject \"o\" {\r\n\tBVertex 3 {\r\n",
+    b"Metasequoia Document\r\nObject \"o\" {\r\n\tvertex 1 {\r\n\t\t0 0\r\n",
+])
+def test_validate_truncated(tmp_path, data):
+    path = write_document(tmp_path / "cut.mqo", data)
+    errors, warnings = mqo_cli.validate_file(path)
+    assert len(errors) == 1 and errors[0].startswith("can't be parsed")
+
+
+def test_validate_ok(tmp_path, capsys):
+    path = write_document(tmp_path / "doc.mqo", DOCUMENT)
+    assert mqo_cli.main(["validate", "--strict", path]) == 0
+    assert capsys.readouterr().out == "%s: ok\n" % path
+
+
+def test_stat_missing_file(tmp_path, capsys):
+    assert mqo_cli.main(["stat", str(tmp_path / "missing.mqo")]) == 1
+    assert "can't be parsed" in capsys.readouterr().err
+
+
+def test_convert_extracts_only_safe_textures(tmp_path):
+    src = str(tmp_path / "in.mqoz")
+    with zipfile.ZipFile(src, 'w') as zfile:
+        zfile.writestr("in.mqo", DOCUMENT)
+        zfile.writestr("tex/sub.png", b"png")
+        zfile.writestr("../up.png", b"up")
+        zfile.writestr("unused.png", b"unused")
+    out = tmp_path / "out"
+    out.mkdir()
+    assert mqo_cli.main(["convert", src, str(out / "doc.mqo")]) == 0
+    assert (out / "tex" / "sub.png").read_bytes() == b"png"
+    assert not (tmp_path / "up.png").exists()
+    assert not (out / "unused.png").exists()
+    text = (out / "doc.mqo").read_text()
+    assert "shader(3) vcol(1) dbls(1)" in text
+    assert "\tdepth 1\n" in text and "\tdepth 0\n" not in text
+    assert "3 V(0 2 3) M(1)\n" in text
+
+
+def test_convert_keeps_shift_jis_names(tmp_path):
+    src = str(tmp_path / "sjis.mqo")
+    dst = str(tmp_path / "out.mqo")
+    generate.generate(src, objects=2, verts=20, shift_jis=True)
+    assert mqo_cli.main(["convert", src, dst]) == 0
+    materials, objects = mqo_parser.parse_file(src, rot90=False)
+    materials2, objects2 = mqo_parser.parse_file(dst, rot90=False)
+    assert [ob.name for ob in objects] == ["オブジェクト0", "オブジェクト1"]
+    assert [ob.name for ob in objects2] == [ob.name for ob in objects]
+    assert all(ob.shift_jis for ob in objects2)
+
+
+def test_convert_missing_file(tmp_path, capsys):
+    src = str(tmp_path / "missing.mqo")
+    assert mqo_cli.main(["convert", src, str(tmp_path / "out.mqo")]) == 1
+    assert "%s: error: can't be parsed" % src in capsys.readouterr().err
+    assert not (tmp_path / "out.mqo").exists()
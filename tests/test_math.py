@@ -0,0 +1,127 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the block operations, with NumPy and with the array fallback."""
+
+from array import array
+
+import pytest
+
+from io_scene_mqo import mqo_math
+
+COORDS = [1.0, 2.0, 3.0, -4.0, 0.5, 6.0]
+
+
+@pytest.fixture(params=["numpy", "array"], autouse=True)
+def backend(request, monkeypatch):
+    if request.param == "array":
+        monkeypatch.setattr(mqo_math, "numpy", None)
+    elif mqo_math.numpy is None:
+        pytest.skip("NumPy isn't installed")
+    return request.param
+
+
+def test_transform_coords_to_blender():
+    coords = array('f', COORDS)
+    assert mqo_math.transform_coords(coords, True, 2.0) is coords
+    # (x, y, z) -> (x, -z, y)
+    assert coords == array('f', [2, -6, 4, -8, -12, 1])
+
+
+def test_transform_coords_to_metasequoia():
+    coords = array('f', COORDS)
+    mqo_math.transform_coords(coords, True, 0.5, inverse=True)
+    # (x, y, z) -> (x, z, -y)
+    assert coords == array('f', [0.5, 1.5, -1, -2, 3, -0.25])
+
+
+def test_transform_coords_round_trip():
+    coords = array('f', COORDS)
+    mqo_math.transform_coords(coords, True, 1.0)
+    mqo_math.transform_coords(coords, True, 1.0, inverse=True)
+    assert coords == array('f', COORDS)
+
+
+def test_transform_coords_scale_only():
+    coords = array('f', COORDS)
+    mqo_math.transform_coords(coords, False, 2.0)
+    assert coords == array('f', [2 * c for c in COORDS])
+    empty = array('f')
+    assert mqo_math.transform_coords(empty, True, 2.0) == array('f')
+
+
+def test_face_corners():
+    # a triangle, a quad and a pentagon whose loops are out of order
+    loop_start = array('i', [5, 0, 9])
+    loop_total = array('i', [3, 4, 5])
+    assert list(mqo_math.face_corners(loop_start, loop_total)) == [
+        5, 6, 7, 0, 1, 2, 3, 9, 10, 11, 12, 13]
+    assert list(mqo_math.face_corners(loop_start, loop_total, True)) == [
+        5, 7, 6, 0, 3, 2, 1, 9, 13, 12, 11, 10]
+    assert list(mqo_math.face_corners(array('i'), array('i'), True)) == []
+
+
+def test_gather():
+    values = array('f', [0, 1, 10, 11, 20, 21])
+    indices = array('i', [2, 0, 2])
+    assert mqo_math.gather(values, indices, 2) == [20, 21, 0, 1, 20, 21]
+    assert mqo_math.gather(values, indices) == [10, 0, 10]
+    assert mqo_math.gather(array('f'), array('i'), 2) == []
+
+
+def test_corner_uvs():
+    uvs = array('f', [0.0, 0.25, 1.0, 0.5])
+    corners = array('i', [1, 0])
+    assert mqo_math.corner_uvs(uvs, corners) == [1.0, 0.5, 0.0, 0.25]
+    assert mqo_math.corner_uvs(uvs, corners, True) == [1.0, 0.5, 0.0, 0.75]
+
+
+def test_flip_v():
+    uvs = array('f', [0.0, 0.25, 1.0, 1.0, 0.5, 0.0])
+    flipped = mqo_math.flip_v(uvs)
+    assert flipped == array('f', [0.0, 0.75, 1.0, 0.0, 0.5, 1.0])
+    # a copy, the parsed UVs stay as they are
+    assert uvs == array('f', [0.0, 0.25, 1.0, 1.0, 0.5, 0.0])
+    assert mqo_math.flip_v(array('f')) == array('f')
+
+
+def test_scatter():
+    target = array('f', [0.0] * 6)
+    indices = array('i', [2, -1, 5, 0])
+    values = array('f', [1, 2, 3, 4, 5, 6, 7, 8])
+    assert mqo_math.scatter(target, indices, values, 2) is target
+    # out of range indices are skipped, not wrapped
+    assert target == array('f', [7, 8, 0, 0, 1, 2])
+    weights = array('f', [0.0] * 3)
+    # the values run out before the indices
+    mqo_math.scatter(weights, array('i', [1, 2]), array('f', [0.5]))
+    assert weights == array('f', [0, 0.5, 0])
+    assert mqo_math.scatter(weights, array('i'), array('f')) == weights
+
+
+def test_unpack_colors():
+    # 0xAABBGGRR
+    colors = array('I', [0x80FF7F00, 0xFFFFFFFF])
+    assert mqo_math.unpack_colors(colors) == array('f', [
+        0, 127 / 255, 1, 128 / 255, 1, 1, 1, 1])
+    linear = mqo_math.unpack_colors(colors, linear=True)
+    assert list(linear) == pytest.approx([
+        0, 0.2122, 1, 128 / 255, 1, 1, 1, 1], abs=1e-4)
+    assert colors == array('I', [0x80FF7F00, 0xFFFFFFFF])
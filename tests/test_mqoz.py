@@ -0,0 +1,56 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the zipped .mqoz documents."""
+
+import zipfile
+
+from io_scene_mqo import mqo_cli, mqo_parser, mqo_writer
+from tests.samples import DOCUMENT, check_quad, parse_bytes
+
+
+def test_write_parse_round_trip(tmp_path):
+    materials, objects = parse_bytes(DOCUMENT)
+    path = str(tmp_path / "out.mqoz")
+    lines = [mqo_cli._material_line(mat) for mat in materials]
+    mqo_writer.write_file(path, 1.0, lines, [(ob, 0) for ob in objects],
+                          False, True, False, mqoz=True)
+    materials2, objects2 = mqo_parser.parse_file(path, rot90=False)
+    assert [mat.line for mat in materials2] == [mat.line for mat in materials]
+    check_quad(objects2[0])
+    assert objects2[0].coords == objects[0].coords
+    assert objects2[0].attrs[-3:] == ["\tdepth 1\n", "\tvisible 0\n",
+                                      "\tmirror 1\n"]
+
+
+def test_mqoz_members(tmp_path):
+    materials, objects = parse_bytes(DOCUMENT)
+    texture = tmp_path / "tex.png"
+    texture.write_bytes(b"png")
+    path = str(tmp_path / "out.mqoz")
+    mqo_writer.write_file(path, 1.0, None, [(ob, 0) for ob in objects],
+                          False, True, False, mqoz=True, compress_level=9,
+                          textures=[("tex.png", str(texture)),
+                                    ("tex/sub.png", b"sub")])
+    with zipfile.ZipFile(path) as zfile:
+        assert zfile.namelist() == ["out.mqo", "tex.png", "tex/sub.png"]
+        assert zfile.getinfo("out.mqo").compress_type == zipfile.ZIP_DEFLATED
+        assert zfile.read("tex/sub.png") == b"sub"
+        assert zfile.read("out.mqo").startswith(b"Metasequoia Document\n")
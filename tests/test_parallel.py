@@ -0,0 +1,140 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the parallel parsing and writing."""
+
+import errno
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from benchmarks import generate
+from io_scene_mqo import mqo_parser, mqo_writer
+from tests.samples import DOCUMENT, OBJECT
+
+
+def same_objects(objects, expected):
+    assert len(objects) == len(expected)
+    for ob, other in zip(objects, expected):
+        for slot in type(ob).__slots__:
+            assert getattr(ob, slot) == getattr(other, slot)
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = str(tmp_path / "doc.mqo")
+    generate.generate(path, objects=4, verts=50, materials=2, seed=3)
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def format_records(records, workers):
+    parts = []
+    mqo_writer.write_objects(parts.append, None, records, False, True, False,
+                             workers)
+    return "".join(parts)
+
+
+def test_scan_blocks_jumps_over_payload():
+    blocks = mqo_parser.scan_blocks(DOCUMENT)
+    assert [key for key, start, end in blocks] == [
+        b"Scene", b"Unknown", b"Material", b"Object"]
+    key, start, end = blocks[-1]
+    assert DOCUMENT[start:end] == OBJECT
+
+
+def test_parse_in_pool(document):
+    materials = []
+    objects = list(mqo_parser.iter_objects_parallel(None, document, False,
+                                                    workers=2,
+                                                    materials=materials))
+    expected_materials = []
+    expected = list(mqo_parser.iter_objects(None, io.BytesIO(document), False,
+                                            materials=expected_materials))
+    assert [mat.line for mat in materials] == [
+        mat.line for mat in expected_materials]
+    same_objects(objects, expected)
+
+
+def test_parse_without_pool(monkeypatch, capsys, document):
+    def broken(workers):
+        raise OSError("no processes")
+
+    monkeypatch.setattr(mqo_parser, "ProcessPoolExecutor", broken)
+    objects = list(mqo_parser.iter_objects_parallel(None, document, False,
+                                                    workers=2))
+    expected = list(mqo_parser.iter_objects(None, io.BytesIO(document), False))
+    same_objects(objects, expected)
+    assert "Parallel parsing failed (no processes)" in capsys.readouterr().out
+
+
+@pytest.fixture
+def records(document):
+    objects = mqo_parser.iter_objects(None, io.BytesIO(document), False)
+    return [(ob, 1) for ob in objects]
+
+
+def test_write_in_pool(records):
+    assert format_records(records, 2) == format_records(records, 1)
+
+
+def test_write_after_broken_pool(monkeypatch, capsys, records):
+    calls = []
+    submit = ProcessPoolExecutor.submit
+
+    def breaking(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3:
+            raise BrokenProcessPool("worker died")
+        return submit(self, *args, **kwargs)
+
+    expected = format_records(records, 1)
+    monkeypatch.setattr(ProcessPoolExecutor, "submit", breaking)
+    assert format_records(records, 2) == expected
+    assert "Parallel serialization failed (worker died)" in (
+        capsys.readouterr().out)
+
+
+def test_write_error_goes_through(capsys, records):
+    def full(text):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    with pytest.raises(OSError):
+        mqo_writer.write_objects(full, None, records, False, True, False, 2)
+    assert "Parallel" not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_write_files_reports_failed_file(tmp_path, workers, records):
+    paths = [str(tmp_path / ("%i.mqo" % i)) for i in range(4)]
+    # a file can't be created under a file
+    paths[1] = os.path.join(paths[0], "sub.mqo")
+    jobs = [(path, 1.0, None, [record], False, True, False)
+            for path, record in zip(paths, records)]
+    written, failed = mqo_writer.write_files(jobs, workers)
+    assert written == paths[:1] + paths[2:]
+    assert [path for path, e in failed] == paths[1:2]
+    assert isinstance(failed[0][1], OSError)
+    for path, (ob, mat_offset) in zip(written, records[:1] + records[2:]):
+        materials, objects = mqo_parser.parse_file(path, rot90=False)
+        assert objects[0].name == ob.name
@@ -0,0 +1,46 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the streaming parser."""
+
+from array import array
+
+from io_scene_mqo import mqo_parser
+from tests.samples import DOCUMENT, check_quad, parse_bytes, write_document
+
+
+def test_parse_document():
+    materials, objects = parse_bytes(DOCUMENT)
+    assert [mat.name for mat in materials] == ["red", "tex"]
+    assert materials[0].color == array('f', [1, 0, 0, 1])
+    assert materials[1].tex == "tex/sub.png"
+    assert len(objects) == 1
+    ob = objects[0]
+    check_quad(ob)
+    assert ob.coords == array('f', [0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0])
+    assert list(ob.loop_start) == [0, 3]
+    assert list(ob.loop_total) == [3, 3]
+
+
+def test_parse_file_rot90_and_scale(tmp_path):
+    path = write_document(tmp_path / "doc.mqo", DOCUMENT)
+    materials, objects = mqo_parser.parse_file(path, rot90=True, scale=2.0)
+    # Metasequoia's y up becomes Blender's z up
+    assert objects[0].coords[6:9] == array('f', [2, 0, 2])
@@ -0,0 +1,178 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Import then export through the stand-in of bpy used by the benchmarks."""
+
+import pathlib
+import sys
+from array import array
+
+import pytest
+
+from benchmarks import generate, standin
+from io_scene_mqo import mqo_math, mqo_parser, mqo_writer
+
+STANDIN_MODULES = ("bpy", "bpy.props", "bpy.types", "bpy_extras",
+                   "bpy_extras.io_utils", "mathutils")
+
+
+@pytest.fixture(scope="module")
+def blender():
+    before = set(sys.modules)
+    if not standin.install():
+        pytest.skip("bpy is there, the stand-in can't be used")
+    import bpy
+    yield bpy
+    for name in STANDIN_MODULES:
+        if name not in before:
+            sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def document(tmp_path, blender):
+    path = str(tmp_path / "doc.mqo")
+    generate.generate(path, objects=3, verts=40, mix=(1, 1, 1), materials=2,
+                      seed=1)
+    from io_scene_mqo import import_mqo
+    standin.reset()
+    import_mqo.open_mqo(standin.Operator(), pathlib.Path(path), True, 1.0,
+                        False)
+    return path
+
+
+def export(blender, path, invert=False, no_ngons=False, **options):
+    from io_scene_mqo import export_mqo
+    objects = [ob for ob in blender.data.objects if ob.type == 'MESH']
+    export_mqo.export_mqo(standin.Operator(), path, objects, True, invert,
+                          no_ngons, True, True, True, True, True, 1.0,
+                          **options)
+    return mqo_parser.parse_file(path, rot90=False)
+
+
+def faces(ob):
+    return [list(ob.loop_verts[start:start + total])
+            for start, total in zip(ob.loop_start, ob.loop_total)]
+
+
+def test_round_trip(tmp_path, blender, document):
+    materials, objects = mqo_parser.parse_file(document, rot90=False)
+    materials2, objects2 = export(blender, str(tmp_path / "out.mqo"))
+    assert [mat.name for mat in materials2] == [mat.name for mat in materials]
+    assert len(objects2) == len(objects) == 3
+    for ob, ob2 in zip(objects, objects2):
+        assert ob2.name == ob.name
+        assert ob2.coords == ob.coords
+        assert faces(ob2) == faces(ob)
+        assert ob2.mat_index == ob.mat_index
+        assert ob2.uvs == ob.uvs
+        assert not ob2.errors
+
+
+def test_invert_and_triangulate(tmp_path, blender, document):
+    materials, objects = mqo_parser.parse_file(document, rot90=False)
+    materials2, objects2 = export(blender, str(tmp_path / "tris.mqo"),
+                                  no_ngons=True)
+    materials3, inverted = export(blender, str(tmp_path / "inv.mqo"),
+                                  invert=True, no_ngons=True)
+    for ob, ob2, ob3 in zip(objects, objects2, inverted):
+        assert max(ob.loop_total) > 4 and max(ob2.loop_total) == 4
+        tris = iter(faces(ob2))
+        for face in faces(ob):
+            if len(face) <= 4:
+                assert next(tris) == face
+                continue
+            # an ngon becomes triangles made of its own vertices
+            parts = [next(tris) for i in range(len(face) - 2)]
+            assert all(len(part) == 3 for part in parts)
+            assert set(v for part in parts for v in part) == set(face)
+        assert next(tris, None) is None
+        corners = mqo_math.face_corners(ob2.loop_start, ob2.loop_total, True)
+        assert ob3.loop_verts == array('i', [ob2.loop_verts[c]
+                                             for c in corners])
+        assert ob3.coords == ob.coords
+
+
+def test_incremental_export(tmp_path, monkeypatch, blender, document):
+    formatted = []
+    format_object = mqo_writer.format_object
+
+    def counting(ob, *args):
+        formatted.append(ob.name)
+        return format_object(ob, *args)
+
+    monkeypatch.setattr(mqo_writer, "format_object", counting)
+    first = tmp_path / "first.mqo"
+    export(blender, str(first), incremental=True)
+    assert formatted == ["obj0", "obj1", "obj2"]
+    second = tmp_path / "second.mqo"
+    export(blender, str(second), incremental=True)
+    assert formatted == ["obj0", "obj1", "obj2"]
+    assert second.read_bytes() == first.read_bytes()
+    # only the moved vertex's object is formatted again
+    ob = next(ob for ob in blender.data.objects if ob.name == "obj1")
+    ob.data.vertices.data["co"][0] += 1.0
+    materials, objects = export(blender, str(second), incremental=True)
+    assert formatted[3:] == ["obj1"]
+    assert second.read_bytes() != first.read_bytes()
+    assert objects[1].coords[0] == pytest.approx(
+        mqo_parser.parse_file(str(first), rot90=False)[1][1].coords[0] + 1.0)
+
+
+
+def test_parallel_import(tmp_path, monkeypatch, blender, document):
+    serial = tmp_path / "serial.mqo"
+    export(blender, str(serial))
+    calls = []
+    iter_objects_parallel = mqo_parser.iter_objects_parallel
+
+    def parsing(*args):
+        calls.append(args)
+        return iter_objects_parallel(*args)
+
+    monkeypatch.setattr(mqo_parser, "iter_objects_parallel", parsing)
+    from io_scene_mqo import import_mqo
+    # the pool is only started for large files otherwise
+    monkeypatch.setattr(import_mqo, "PARALLEL_MIN_BYTES", 0)
+    standin.reset()
+    op = standin.Operator()
+    import_mqo.open_mqo(op, pathlib.Path(document), True, 1.0, False,
+                        workers=2)
+    assert len(calls) == 1
+    assert not [msg for level, msg in op.reports if 'WARNING' in level]
+    parallel = tmp_path / "parallel.mqo"
+    export(blender, str(parallel))
+    assert parallel.read_bytes() == serial.read_bytes()
+
+
+def test_parallel_export(tmp_path, monkeypatch, blender, document):
+    serial = tmp_path / "serial.mqo"
+    export(blender, str(serial))
+    submitted = []
+    submit = mqo_writer._submit
+
+    def submitting(executor, func, ob, *args):
+        submitted.append(ob.name)
+        return submit(executor, func, ob, *args)
+
+    monkeypatch.setattr(mqo_writer, "_submit", submitting)
+    parallel = tmp_path / "parallel.mqo"
+    export(blender, str(parallel), workers=2)
+    assert submitted == ["obj0", "obj1", "obj2"]
+    assert parallel.read_bytes() == serial.read_bytes()
@@ -0,0 +1,73 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""Tests of the block skipping and of the weit and color import."""
+
+import pytest
+
+from benchmarks import generate
+from io_scene_mqo import mqo_parser
+from tests.samples import DOCUMENT, check_quad, parse_bytes
+
+WEIT = (b"Metasequoia Document\r\nFormat Text Ver 1.0\r\n"
+        b'Object "o" {\r\n\tvertex 3 {\r\n\t\t0 0 0\r\n\t\t1 0 0\r\n'
+        b"\t\t0 1 0\r\n\t}\r\n\tvertexattr {\r\n\t\tweit {\r\n"
+        b"\t\t\t0 0.250\r\n\t\t\t2 1.000\r\n\t\t}\r\n"
+        b"\t\tcolor {\r\n\t\t\t1 4278190335\r\n\t\t}\r\n\t}\r\n"
+        b"\tface 1 {\r\n\t\t3 V(0 1 2)\r\n\t}\r\n}\r\nEof\r\n")
+
+
+@pytest.mark.parametrize("buffer_size", range(8, 120, 7))
+def test_skip_block_across_buffer_boundary(monkeypatch, buffer_size):
+    # every brace, Vector header and payload byte ends up on a boundary
+    # for one of the sizes
+    monkeypatch.setattr(mqo_parser, "READ_BUFFER", buffer_size)
+    materials, objects = parse_bytes(DOCUMENT, buffer_size)
+    assert [mat.name for mat in materials] == ["red", "tex"]
+    assert len(objects) == 1
+    check_quad(objects[0])
+
+
+def test_vertex_data(tmp_path):
+    path = str(tmp_path / "weit.mqo")
+    with open(path, 'wb') as fp:
+        fp.write(WEIT)
+    materials, objects = mqo_parser.parse_file(path, rot90=False,
+                                               vertex_data=True)
+    ob = objects[0]
+    assert list(ob.weit_verts) == [0, 2]
+    assert list(ob.weits) == pytest.approx([0.25, 1.0])
+    assert list(ob.color_verts) == [1]
+    assert list(ob.colors) == [4278190335]
+    assert list(ob.loop_verts) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("bvertex", [False, True])
+def test_vertex_data_skipped(tmp_path, bvertex):
+    path = str(tmp_path / "weit.mqo")
+    generate.generate(path, objects=2, verts=30, bvertex=bvertex, weit=True)
+    materials, objects = mqo_parser.parse_file(path, rot90=False)
+    materials2, objects2 = mqo_parser.parse_file(path, rot90=False,
+                                                 vertex_data=True)
+    for ob, ob2 in zip(objects, objects2):
+        assert not ob.weits and len(ob2.weits) == 30
+        assert ob.coords == ob2.coords
+        assert ob.loop_verts == ob2.loop_verts
+        assert not ob.errors and not ob2.errors